@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  Benchmark of Config.load for daemon config with long exclude-dirs list (it also checks that
+#  excluded folders with boolean-like names are kept as folder names)
+#  Usage: python3 benchmarks/config_load.py [number of excluded dirs (default 10000)]
+
+import os, sys, time, tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from ydcore import Config, YDDaemon
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+with tempfile.NamedTemporaryFile('wt', suffix='.cfg', delete=False) as f:
+  f.write('dir="/home/user/Yandex.Disk"\nauth="/home/user/.config/yandex-disk/passwd"\n')
+  f.write('exclude-dirs=%s, y, "no", True\n' %
+          ', '.join('"folder %d/sub_dir-%d"' % (i, i) for i in range(n)))
+try:
+  start = time.perf_counter()
+  cfg = Config(f.name)
+  print('Config.load with %d excluded dirs: %.1f ms' % (n, (time.perf_counter() - start) * 1000))
+  assert len(cfg['exclude-dirs']) == n + 3
+  cfg = YDDaemon._DConfig(f.name)
+  assert cfg['exclude-dirs'][-3:] == ['y', 'no', 'True'], cfg['exclude-dirs'][-3:]
+  assert all(d in cfg.excludes for d in ('y', 'no', 'True')) and len(cfg.excludes) == n + 3
+finally:
+  os.remove(f.name)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  Fuzz test of daemon status output parser (YDDaemon._parseOutput)
+#  It checks the outputs from status_corpus directory and randomly generated outputs with
+#  quotes, colons, non-ASCII symbols and spaces in paths of last synchronized items.
+#  Usage: python3 benchmarks/status_fuzz.py [number of random outputs (default 10000)] [seed]
+
+import os, sys, random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from ydcore import YDDaemon
+
+def parser():                   # YDDaemon object that has only status values (no daemon needed)
+  d = YDDaemon.__new__(YDDaemon)
+  d.vals = YDDaemon._dvals
+  d.update = YDDaemon._noUpdate
+  d._lastOut = None
+  return d
+
+# Expected status values for corpus outputs
+corpus = {
+  'idle': {'status': 'idle', 'progress': '', 'total': '10 GB', 'used': '2.14 GB',
+           'free': '7.86 GB', 'trash': '0 B',
+           'lastitems': ['Documents/report.odt', 'Documents', 'Photos/IMG_0001.jpg']},
+  'busy': {'status': 'busy', 'progress': '12.5 MB/ 40 MB (31 %)', 'trash': '1.2 MB',
+           'lastitems': ['video/clip.mp4']},
+  'error': {'status': 'error', 'used': '2.14 GB', 'lastitems': []},
+  'no_net': {'status': 'no_net', 'total': '...', 'lastitems': []},
+  'tricky': {'status': 'idle', 'total': '1 TB', 'free': '124 GB', 'trash': '12 GB',
+             'lastitems': ["it's mine.txt", "notes: 2024/todo: 'urgent'.md",
+                           'Документы/Отчёт 2024', '日本語/ファイル.txt', "a'b'c",
+                           'trailing space ']},
+  'nonewline': {'status': 'idle', 'lastitems': ['no newline at end']},
+  'empty': {'status': 'none', 'progress': '', 'total': '...', 'lastitems': []}}
+
+corpusDir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'status_corpus')
+for name, expected in sorted(corpus.items()):
+  with open(os.path.join(corpusDir, name + '.out'), encoding='utf-8') as f:
+    out = f.read()
+  d = parser()
+  assert d._parseOutput(out), name + ': first output is not reported as changed'
+  for key, val in expected.items():
+    if key == 'lastitems':
+      val = tuple(val)
+    assert getattr(d.vals, key) == val, '%s: %s = %r, expected %r' % (
+             name, key, getattr(d.vals, key), val)
+  assert not d._parseOutput(out), name + ': unchanged output is reported as changed'
+print('Corpus: %d outputs OK' % len(corpus))
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+rnd = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+symbols = "ab xyz019_-.:'\"/\\,()[]#%&абвЁё日本語é\t"
+
+def randomPath():
+  return ''.join(rnd.choice(symbols) for _ in range(rnd.randint(1, 40))).strip('\t') or 'x'
+
+d = parser()
+for i in range(n):
+  status = rnd.choice(['idle', 'busy', 'paused', 'index', 'no internet access', 'error', ''])
+  sizes = {k: '%d.%d %s' % (rnd.randint(0, 999), rnd.randint(0, 99), rnd.choice(['B', 'MB', 'GB']))
+           for k in ('Total', 'Used', 'Available', 'Trash size')}
+  items = [randomPath() for _ in range(rnd.randint(0, 10))]
+  lines = ['Synchronization core status: ' + status] if status else []
+  if status == 'busy':
+    lines.append('Sync progress: %d MB/ 100 MB (%d %%)' % ((i % 100,) * 2))
+  lines.append("Path to Yandex.Disk directory: '/home/user/%s'" % randomPath())
+  lines.extend('\t%s: %s' % kv for kv in sizes.items())
+  if items:
+    lines += ['', 'Last synchronized items:']
+    lines.extend("\t%s: '%s'" % (rnd.choice(['file', 'directory']), p) for p in items)
+  out = rnd.choice(['\n', '\r\n']).join(lines) + rnd.choice(['', '\n'])
+  last = d.vals.status
+  d._parseOutput(out)
+  expected = ('none' if not status else last if status == 'index' else
+              'no_net' if status == 'no internet access' else status)
+  assert d.vals.status == expected, (out, d.vals.status, expected)
+  assert d.vals.total == sizes['Total'] and d.vals.trash == sizes['Trash size'], out
+  assert d.vals.lastitems == tuple(items), (out, d.vals.lastitems, items)
+  assert not d._parseOutput(out)
+print('Random: %d outputs OK' % n)
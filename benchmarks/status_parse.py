@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  Micro-benchmark of daemon status output parser (YDDaemon._parseOutput)
+#  Usage: python3 benchmarks/status_parse.py [number of parser calls (default 100000)]
+
+import os, sys, re, timeit
+from itertools import cycle
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from ydcore import YDDaemon
+
+d = YDDaemon.__new__(YDDaemon)  # Status values are only needed (no daemon)
+d.vals = YDDaemon._dvals
+d.update = YDDaemon._noUpdate
+d._lastOut = None
+
+corpusDir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'status_corpus')
+with open(os.path.join(corpusDir, 'idle.out'), encoding='utf-8') as f:
+  idle = f.read()
+with open(os.path.join(corpusDir, 'busy.out'), encoding='utf-8') as f:
+  busy = f.read()
+
+# Status values dictionary of the previous parser implementation
+vals = {'status':'', 'progress':'', 'laststatus':'', 'total':'...',
+        'used':'...', 'free':'...', 'trash':'...', 'lastitems':[]}
+
+def previous(vals, out):        # Previous parser implementation (without status conversion)
+  output = out.split('Last synchronized items:')
+  files = output[1] if len(output) == 2 else ''
+  res = dict([re.findall(r'\s*(.+):\s*(.*)', l)[0] for l in output[0].splitlines() if ':' in l])
+  for srch, key in (('Synchronization core status', 'status'), ('Sync progress', 'progress'),
+                    ('Total', 'total'), ('Used', 'used'), ('Available', 'free'),
+                    ('Trash size', 'trash')):
+    val = res.get(srch, '')
+    if vals[key] != val:
+      vals[key] = val
+  buf = re.findall(r".*: '(.*)'\n", files)
+  if vals['lastitems'] != buf:
+    vals['lastitems'] = buf
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+same = cycle([idle, idle.encode().decode()])  # Equal outputs, but different objects like real ones
+changed = cycle([idle, busy])
+for name, stmt in (('previous implementation', lambda: previous(vals, next(changed))),
+                   ('changed output', lambda: d._parseOutput(next(changed))),
+                   ('unchanged output', lambda: d._parseOutput(next(same)))):
+  t = timeit.timeit(stmt, number=n)
+  print('_parseOutput, %s: %.2f us per call' % (name, t / n * 1e6))
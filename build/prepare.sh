@@ -14,6 +14,7 @@ mkdir -p usr/share/yd-tools/icons/light
 mkdir -p usr/share/yd-tools/translations
 cp ../../yandex-disk-indicator.py usr/bin/yandex-disk-indicator
 cp ../../ya-setup usr/share/yd-tools/
+cp ../../ydcore.py usr/share/yd-tools/
 cp ../../translations/yandex-disk-indicator_ru.mo usr/share/locale/ru/LC_MESSAGES/yandex-disk-indicator.mo
 cp ../../translations/yandex-disk-indicator_el.mo usr/share/locale/el/LC_MESSAGES/yandex-disk-indicator.mo
 cp ../../translations/yandex-disk-indicator_bg.mo usr/share/locale/bg/LC_MESSAGES/yandex-disk-indicator.mo
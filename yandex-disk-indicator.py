@@ -20,312 +20,58 @@ appVer = '1.8.13'
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import gi, os, sys, subprocess, pyinotify, fcntl, gettext, datetime, logging, re, argparse, locale
+import time
+startTime = time.monotonic()            # Start time for startup profile
+import os, sys, subprocess, fcntl, gettext, datetime, logging, re, argparse, locale, signal
+from os.path import exists as pathExists, join as pathJoin, dirname, realpath
+# Core module is searched near this file first (run from sources) and then in install directory
+sys.path[:0] = [dirname(realpath(__file__)), '/usr/share/yd-tools']
+import ydcore
+from ydcore import (CVal, Config, ExcludeIndex, Timer, Coalescer, FileWatcher, StatusSnapshot,
+                    MetricsExporter, Profiler, FlightRecorder, YDDaemon, copyFile, deleteFile,
+                    makedirs, daemonOptions, metricsFile, formatSize)
+if __name__ == '__main__' and '--headless' in sys.argv[1:]:
+  # Run the monitor without GUI (GI bindings are not imported)
+  sys.exit(ydcore.main([a for a in sys.argv[1:] if a != '--headless']))
+import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 gi.require_version('AppIndicator3', '0.1')
 from gi.repository import AppIndicator3 as appIndicator
-gi.require_version('Notify', '0.7')
-from gi.repository import Notify
-from gi.repository import Gio
 from gi.repository import GLib
 from gi.repository import GdkPixbuf
-from os.path import exists as pathExists, join as pathJoin
-from shutil import copy as fileCopy
 from webbrowser import open_new as openNewBrowser
-
-#### Common utility functions and classes
-def copyFile(src, dst):
-  try:
-    fileCopy (src, dst)
-  except:
-    logger.error("File Copy Error: from %s to %s" % (src, dst))
-
-def deleteFile(dst):
-  try:
-    os.remove(dst)
-  except:
-    logger.error('File Deletion Error: %s' % dst)
-
-def makedirs(dst):
-  try:
-    os.makedirs(dst, exist_ok=True)
-  except:
-    logger.error('Dirs creation Error: %s' % dst)
-
-class CVal(object):             # Multivalue helper
-  ''' Class to work with value that can be None, scalar item or list of items depending
-      of number of elementary items added to it. '''
-
-  def __init__(self, initialValue=None):
-    self.set(initialValue)   # store initial value
-    self.index = None
-
-  def get(self):                  # It just returns the current value of cVal
-    return self.val
-
-  def set(self, value):           # Set internal value
-    self.val = value
-    if isinstance(self.val, list) and len(self.val) == 1:
-      self.val = self.val[0]
-    return self.val
-
-  def add(self, item):            # Add item
-    if isinstance(self.val, list):  # Is it third, fourth ... value?
-      self.val.append(item)         # Just append new item to list
-    elif self.val is None:          # Is it first item?
-      self.val = item               # Just store item
-    else:                           # It is the second item.
-      self.val = [self.val, item]   # Convert scalar value to list of items.
-    return self.val
-
-  def remove(self, item):
-    if isinstance(self.val, list):
-      self.val.remove(item)
-      if len(self.val) == 1:
-        self.val = self.val[0]
-    elif self.val is None:
-      raise ValueError
-    else:
-      if self.val == item:
-        self.val = None
-      else:
-        raise ValueError
-    return self.val
-
-  def __iter__(self):             # cVal iterator object initialization
-    if isinstance(self.val, list):  # Is CVal a list?
-      self.index = -1
-    elif self.val is None:          # Is CVal not defined?
-      self.index = None
-    else:                           # CVal is scalar type.
-      self.index = -2
-    return self
-
-  def __next__(self):             # cVal iterator support
-    if self.index is None:            # Is CVal not defined?
-      raise StopIteration             # Stop iterations
-    self.index += 1
-    if self.index >= 0:               # Is CVal a list?
-      if self.index < len(self.val):  # Is there a next element in list?
-        return self.val[self.index]
-      else:                           # There is no more elements in list.
-        self.index = None
-        raise StopIteration           # Stop iterations
-    else:                             # CVal has scalar type.
-      self.index = None               # Remember that there is no more iterations possible
-      return self.val
-
-  def __str__(self):              # String representation of CVal
-    return str(self.val)
-
-  def __getitem__(self, index):   # Access to cVal items by index
-    if isinstance(self.val, list):
-      return self.val[index]          # It raises IndexError when index is out of range(len(cVal))
-    elif self.val is None:
-      raise IndexError                # None value cannot be received by any index
-    elif not index:                   # cVal is scalar and index is 0?
-      return self.val
-    else:
-      raise IndexError
-
-  def __len__(self):              # Length of cVal
-    if isinstance(self.val, list):
-      return len(self.val)
-    return 0 if self.val is None else 1
-
-  def __contains__(self, item):   # 'in' opertor function
-    if isinstance(self.val, list):
-      return item in self.val
-    elif self.val is None:
-      return item is None
-    else:
-      return self.val == item
-
-  def __bool__(self):
-    return self.val is not None
-
-class Config(dict):             # Configuration
-
-  def __init__(self, fileName, load=True,
-               bools=[['true', 'yes', 'y'], ['false', 'no', 'n']],
-               boolval=['yes', 'no'], usequotes=True, delimiter='='):
-    #super(Config, self).__init__(self)
-    self.fileName = fileName
-    self.bools = bools             # Values to detect boolean in self.load
-    self.boolval = boolval         # Values to write boolean in self.save
-    self.usequotes = usequotes     # Use quotes for keys and values in self.save
-    self.delimiter = delimiter     # Use specified delimiter between key and value
-    self.changed = False           # Change flag (for use outside of the class)
-    if load:
-      self.load()
-
-  def decode(self, value):              # Convert string to value before store it
-    #logger.debug("Decoded value: '%s'"%value)
-    if value.lower() in self.bools[0]:
-      value = True
-    elif value.lower() in self.bools[1]:
-      value = False
-    return value
-
-  def getValue(self, st):               # Parse value(s) from string after '='
-    words = re.findall(r'("[^"]*")|([~/.\w-]+)', st)  # Get list of values
-    words = [p[0]+p[1] for p in words]                # Join words variants
-    # Check commas and not correct symbols that are not part of words
-    # Substitute found words by '*' and split line by commas
-    mask = re.sub((''.join(r'(?<=[\W])%s(?=[\W])|'%p for p in words))[:-1],
-                   '*', ' %s ' % st).split(',')
-    # Correctly masked value have to be just one '*' and possible surrounded by spaces
-    # Number of '*' must be equal to number of words
-    if sum([len(p.strip()) for p in mask]) == len(words):
-      # Values are OK, store them
-      res = CVal()
-      for p in words:                                 # decode vales with removed quotes
-        res.add(self.decode(p[1:-1] if p[0] == '"' else p))
-      return res.get()
-    else:
-      return None                                     # Something wrong in values string
-
-  def load(self, bools=[['true', 'yes', 'y'], ['false', 'no', 'n']], delimiter='='):
-    """
-    Reads config file to dictionary (OrderedDict).
-    Config file should contain key=value rows.
-    Key can be quoted or not.
-    Value can be one item or list of comma-separated items. Each value item can be quoted or not.
-    When value is a single item then it creates key:value item in dictionary
-    When value is a list of items it creates key:[value, value,...] dictionary's item.
-    """
-    self.bools = bools
-    self.delimiter = delimiter
-    try:                              # Read configuration file into list of tuples ignoring blank
-                                      # lines, lines without delimiter, and lines with comments.
-      with open(self.fileName) as cf:
-        res = [re.findall(r'^\s*(.+?)\s*%s\s*(.*)$' % self.delimiter, l)[0]
-               for l in cf if l and self.delimiter in l and l.lstrip()[0] != '#']
-      self.readSuccess = True
-    except:
-      logger.error('Config file read error: %s' % self.fileName)
-      self.readSuccess = False
-      return False
-    for kv, vv in res:        # Parse each line
-      # Check key
-      key = re.findall(r'"([\w-]+)"$|^([\w-]+)$', kv)
-      if not key:
-        logger.warning('Wrong key in line \'%s %s %s\'' % (kv, self.delimiter, vv))
-      else:                           # Key is OK
-        key = key[0][0] + key[0][1]   # Join two possible keys variants (with and without quotes)
-        if not vv.strip():
-          logger.warning('No value specified in line \'%s %s %s\'' % (kv, self.delimiter, vv))
-        else:                         # Value is not empty
-          value = self.getValue(vv)   # Parse values
-          if value is None:
-            logger.warning('Wrong value(s) in line \'%s %s %s\'' % (kv, self.delimiter, vv))
-          else:                       # Value is OK
-            if key in self.keys():    # Check duble values
-              logger.warning(('Double values for one key:\n%s = %s\nand\n%s = %s\n' +
-                              'Last one is stored.') % (key,self[key],key,value))
-            self[key] = value         # Store correct value
-            logger.debug('Config value read as: %s = %s' % (key, str(value)))
-    logger.info('Config read: %s' % self.fileName)
-    return True
-
-  def encode(self, val):                # Convert value to string before save it
-    if isinstance(val, bool):       # Treat Boolean
-      val = self.boolval[0] if val else self.boolval[1]
-    if self.usequotes:
-      val = '"' + val + '"'         # Put value within quotes
-    return val
-
-  def save(self, boolval=['yes', 'no'], usequotes=True, delimiter='='):
-    self.usequotes = usequotes
-    self.boolval = boolval
-    self.delimiter = delimiter
-    try:                                  # Read the file in buffer
-      with open(self.fileName, 'rt') as cf:
-        buf = cf.read()
-    except:
-      logger.warning('Config file access error, a new file (%s) will be created' % self.fileName)
-      buf = ''
-    while buf and buf[-1] == '\n':        # Remove ending blank lines
-      buf = buf[:-1]
-    buf += '\n'                           # Left only one
-    for key, value in self.items():
-      if value is None:
-        res = ''                          # Remove 'key=value' from file if value is None
-        logger.debug('Config value \'%s\' will be removed' % key)
-      else:                               # Make a line with value
-        res = ''.join([key, self.delimiter,
-                       ''.join([self.encode(val) + ', ' for val in CVal(value)])[:-2] + '\n'])
-        logger.debug('Config value to save: %s'%res[:-1])
-      # Find line with key in file the buffer
-      sRe = re.search(r'^[ \t]*["]?%s["]?[ \t]*%s.+\n' % (key, self.delimiter),
-                      buf, flags=re.M)
-      if sRe:                             # Value has been found
-        buf = sRe.re.sub(res, buf)        # Replace it with new value
-      elif res:                           # Value was not found and value is not empty
-        buf += res                        # Add new value to end of file buffer
-    try:
-      with open(self.fileName, 'wt') as cf:
-        cf.write(buf)                     # Write updated buffer to file
-    except:
-      logger.error('Config file write error: %s' % self.fileName)
-      return False
-    logger.info('Config written: %s' % self.fileName)
-    self.changed = False
-    return True
-
-class Timer(object):            # Timer for triggering a function periodically
-  ''' Timer class methods:
-        __init__ - initialize the timer object with specified interval and handler. Start it
-                   if start value is not False. par - is parameter for handler call.
-        start    - Start timer. Optionally the new interval can be specified and if timer is
-                   already running then the interval is updated (timer restarted with new interval).
-        update   - Updates interval. If timer is running it is restarted with new interval. It it
-                   is not running - then interval just stored.
-        stop     - Stop running timer or do nothing if it is not running.
-      Interface variables:
-        active   - True when timer is currently running
+from shutil import which
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from tempfile import mkdtemp
+from shutil import rmtree
+ydcore.loop = GLib                      # Core classes work in GTK main loop
+
+class StartupProfile(object):    # Wall time of startup phases
+  ''' StartupProfile class methods:
+        __init__ - initialize profile with the start time (time.monotonic() value).
+        phase    - Register the end of startup phase with specified name.
+        report   - Returns text report: duration of each phase and total startup time.
   '''
-  def __init__(self, interval, handler, par = None, start = True):
-    self.interval = interval          # Timer interval (ms)
-    self.handler = handler            # Handler function
-    self.par = par                    # Parameter of handler function
-    self.active = False               # Current activity status
-    if start:
-      self.start()                    # Start timer if required
-
-  def start(self, interval = None):   # Start inactive timer or update if it is active
-    if interval is None:
-      interval = self.interval
-    if not self.active:
-      self.interval = interval
-      if self.par is None:
-        self.timer = GLib.timeout_add(interval, self.handler)
-      else:
-        self.timer = GLib.timeout_add(interval, self.handler, self.par)
-      self.active = True
-      #logger.debug('timer started %s %s' %(self.timer, interval))
-    else:
-      self.update(interval)
+  def __init__(self, start):
+    self.start = self.last = start
+    self.phases = []
 
-  def update(self, interval):         # Update interval (restart active, not start if inactive)
-    if interval != self.interval:
-      self.interval = interval
-      if self.active:
-        self.stop()
-        self.start()
+  def phase(self, name):
+    now = time.monotonic()
+    self.phases.append((name, now - self.last))
+    self.last = now
 
-  def stop(self):                     # Stop active timer
-    if self.active:
-      #logger.debug('timer to stop %s' %(self.timer))
-      GLib.source_remove(self.timer)
-      self.active = False
+  def report(self):
+    return '\n'.join(['%-32s %8.1f ms' % (name, t * 1000) for name, t in self.phases] +
+                     ['%-32s %8.1f ms' % ('Total', (self.last - self.start) * 1000)])
 
 class Notification(object):     # On-screen notification
 
   def __init__(self, app, mode):      # Initialize notification engine
-    Notify.init(app)
-    self.notifier = Notify.Notification()
+    self.app = app
+    self.notifier = None              # Notify library is loaded with the first message
     self.switch(mode)
 
   def send(self, title, message):     # Send notification
@@ -339,292 +85,162 @@ class Notification(object):     # On-screen notification
 
   def _message(self, t, m):        # Show on-screen notification message
     global logo
-    logger.debug('Message: %s | %s' % (t, m))
+    logger.debug('Message: %s | %s', t, m)
     try:
+      if self.notifier is None:         # Load and initialize Notify library
+        gi.require_version('Notify', '0.7')
+        from gi.repository import Notify
+        Notify.init(self.app)
+        self.notifier = Notify.Notification()
       self.notifier.update(t, m, logo)  # Update notification
       self.notifier.show()              # Display new notification
     except:
       logger.error('Message engine failure')
 
-#### Main daemon/indicator classes
-class YDDaemon(object):         # Yandex.Disk daemon interface
-  '''
-  This is the fully automated class that serves as daemon interface.
-  Public methods:
-  __init__ - Handles initialization of the object and as a part - auto-start daemon if it
-             is required by configuration settings.
-  getOuput - Provides daemon output (in user language if optional parameter workLang is
-             False or missed)
-  start    - Starts daemon if it is not started yet
-  stop     - Stops running daemon
-  exit     - Handles 'Stop on exit' facility according to daemon configuration settings.
-  change   - Call back function for handling daemon status changes outside the class.
-             It have to be redefined by UI update routine.
-             The parameters of the call - status values dictionary (see vars description below)
-             and the UpdateEvent object with with 4 boolean values:
-              stat is True when status or progress has been changed,
-              prog is True when synchronization progress has been changed,
-              size is True when some of sizes has been changed,
-              last is True when list of last synchronized has been changed,
-              init is True when initial update event is raised.
-  Class interface variables:
-  config   - The daemon configuration dictionary (object of _DConfig(Config) class)
-  vars     - status values dictionary with following keys:
-              'status' - current daemon status
-              'progress' - synchronization progress or ''
-              'laststatus' - previous daemon status
-              'total' - total Yandex disk spase
-              'used' - currntly used spase
-              'free' - available space
-              'trash' - size of trash
-              'lastitems' - list of last synchronized items or []
-  ID       - the daemon identity string (empty in single daemon configuration)
+class Icons(object):            # Registry of indicator icons (shared by all indicators)
+  ''' Icons of theme are resolved once (user icon overrides the installed one) and kept till
+      change in icons directories (they are watched by iNotify). The frames of busy icon
+      animation are prepared paths, so animation doesn't check or build anything.
+      Icons class methods:
+        get - Returns icons of theme (True - light, False - dark): dictionary {status: path}
+              with additional item 'frames' - tuple of busy animation frames.
+      Changes in icons directories are applied to all indicators.
   '''
+  _cache = dict()                   # Resolved themes: {theme: icons}
+  _watchers = None                  # iNotify watchers of icons directories
 
-  # Default daemon status values
-  _dvals = {'status':'', 'progress':'', 'laststatus':'', 'total':'...',
-           'used':'...', 'free':'...', 'trash':'...', 'lastitems':[]}
-
-  class UpdateEvent(object):            # Changes control class
-
-    def __init__(self):
-      self.reset()
-
-    def reset(self):      # Set initial values for object variables
-      self.stat = False         # It become True when status or synchronisation progress changed
-      self.prog = False         # It become True when synchronization progress changed
-      self.size = False         # It become True when some sizes values changed
-      self.last = False         # It become True when when list of last synchronized changed
-      self.init = False         # It become True when initialization event raised
-
-    def __bool__(self):   # Boolean representation of object
-      return self.stat or self.prog or self.size or self.last or self.init
-
-    def __str__(self):    # String representation of object
-      str = (('stat, ' if self.stat else '') +
-             ('prog, ' if self.prog else '') +
-             ('size, ' if self.size else '') +
-             ('last, ' if self.last else '') +
-             ('init, ' if self.init else ''))
-      return '{' + str[: (-2 if str else None)]+'}'
-
-  class _Watcher(object):               # Daemon iNotify watcher
-    '''
-    iNotify watcher object for monitor of changes daemon internal log for the fastest
-    reaction on status change.
-    '''
-    def __init__(self, handler, par=None):
-      # Initialize iNotify watcher
-      class _EH(pyinotify.ProcessEvent):           # Event handler class for iNotifier
-        def process_IN_MODIFY(self, event):
-          handler(par)
-      self._watchMngr = pyinotify.WatchManager()   # Create watch manager
-      # Create PyiNotifier
-      self._iNotifier = pyinotify.Notifier(self._watchMngr, _EH(), timeout=0.5)
-      # Timer will call iNotifier handler every .7 seconds (not started initially)
-      self._timer = Timer(700, self._iNhandle, start=False)
-
-    def _iNhandle(self):                 # iNotify working routine (called by timer)
-      while self._iNotifier.check_events():
-        self._iNotifier.read_events()
-        self._iNotifier.process_events()
-      return True
-
-    def start(self, path):               # Activate iNotify watching
-      # Prepare path
-      self._path = pathJoin(path.replace('~', userHome), '.sync/cli.log')
-      # Add watch
-      self._watch = self._watchMngr.add_watch(self._path, pyinotify.IN_MODIFY, rec = False)
-      # Activate timer
-      self._timer.start()
-
-    def stop(self):                      # Stop iNotify watching
-      # Stop timer
-      self._timer.stop()
-      # Remove watch
-      self._watchMngr.rm_watch(self._watch[self._path])
-
-  class _DConfig(Config):               # Redefined class for daemon config
-
-    def save(self):  # Update daemon config file
-      # Make a copy of Self as super class
-      fileConfig = Config(self.fileName, load=False)
-      fileConfig.update(self)
-      # Convert values representation
-      ro = fileConfig.get('read-only', False)
-      fileConfig['read-only'] = '' if ro else None
-      fileConfig['overwrite'] = '' if fileConfig.get('overwrite', False) and ro else None
-      exList = fileConfig.get('exclude-dirs', None)
-      if exList:
-        fileConfig['exclude-dirs'] = ''.join([i + ',' for i in CVal(exList)])[:-1]
-      fileConfig.save()
-      self.changed=False
-
-    def load(self):  # Get daemon config from its config file
-      if super(YDDaemon._DConfig, self).load():             # Load config from file
-        # Convert values representations
-        self['read-only'] = (self.get('read-only', False) == '')
-        self['overwrite'] = (self.get('overwrite', False) == '')
-        self.setdefault('startonstartofindicator', True)    # New value to start daemon individually
-        self.setdefault('stoponexitfromindicator', False)   # New value to stop daemon individually
-        exDirs = self.setdefault('exclude-dirs', None)
-        if isinstance(exDirs, str):
-          # Additional parsing required when quoted value like "dir,dir,dir" is specified.
-          # When the value specified without quotes it will be already list like [dir, dir, dir].
-          self['exclude-dirs'] = self.getValue(exDirs)
-        return True
-      else:
-        return False
-
-  def __init__(self, cfgFile, ID):      # Check that daemon installed and configured
-    '''
-    cfgFile  - full path to config file
-    ID       - identity string '#<n> ' in multi-instance environment or
-               '' in single instance environment'''
-    self.ID = ID                                      # Remember daemon identity
-    if not pathExists('/usr/bin/yandex-disk'):
-      self._ErrorDialog('NOTINSTALLED')
-      appExit('Daemon is not installed')
-    # Try to read Yandex.Disk configuration file and make sure that it is correctly configured
-    self.config = self._DConfig(cfgFile, load=False)
-    while not (self.config.load() and
-               pathExists(self.config.get('dir', '')) and
-               pathExists(self.config.get('auth', ''))):
-      if self._errorDialog('NOCONFIG') != 0:
-        if ID:
-          self.config['dir'] = ''
-          # Exit from loop in multi-instance configuration
-          break
-        else:
-          appExit('Daemon is not configured')
-    # Initialize watching staff
-    self._wTimer = Timer(2000, self._eventHandler, par=False, start=True)
-    self._tCnt = 0
-    self._iNtfyWatcher = self._Watcher(self._eventHandler, par=True)
-    self.update = YDDaemon.UpdateEvent()              # Initialize changes control object
-    self.vals = YDDaemon._dvals.copy()                # Load default daemon status values
-    # Check that daemon is running
-    out = self.getOutput()
-    if out:                                           # Is daemon running?
-      self._parseOutput(out)                          # Update status values
-      self.vals['laststatus'] = self.vals['status']   # Set unknown last status as current status
-      self.update.init = True                         # Remember that it is initial change event
-      self.change(self.vals, self.update)             # Manually raise initial change event
-      self._iNtfyWatcher.start(self.config['dir'])    # Activate iNotify watcher
-    else:                                             # Daemon is not running
-      started = False
-      if self.config.get('startonstartofindicator', True):
-        started = not self.start()                    # Start daemon if it is required
-      if not started:
-        self.update.init = True                       # Remember that it is initial change event
-        self.vals['status'] = 'none'                  # Set current status as 'none'
-        self.vals['laststatus'] = 'none'              # Set unknown last status also as 'none'
-        self.change(self.vals, self.update)           # Manually raise initial change event
-
-  def _eventHandler(self, iNtf):        # Daemon event handler
-    '''
-    Handle iNotify and and Timer based events.
-    After receiving and parsing the daemon output it raises outside change event if daemon changes
-    at least one of its status values.
-    It can be called by timer (when byNotifier=False) or by iNonifier
-    (when byNotifier=True)'''
-
-    # Parse fresh daemon output. Parsing returns true when something changed
-    if self._parseOutput(self.getOutput()):
-      self.change(self.vals, self.update)     # Raise outside update event
-    logger.debug('Raw event ' + self.ID + ('iNtfy ' if iNtf else 'Timer ') +
-                 self.vals['laststatus'] + ' -> ' + self.vals['status'])
-    # --- Handle timer delays ---
-    if iNtf:                                  # True means that it is called by iNonifier
-      self._wTimer.update(2000)               # Set timer interval to 2 sec.
-      self._tCnt = 0                          # Reset counter as it was triggered not by timer
-    else:                                     # It called by timer
-      if self.vals['status'] != 'busy':       # In 'busy' keep update interval (2 sec.)
-        if self._tCnt < 9:                    # Increase interval up to 10 sec (2 + 8)
-          self._wTimer.update((2 + self._tCnt)*1000)
-          self._tCnt += 1                     # Increase counter to increase delay next activation.
-    return True                               # True is required to continue activations by timer.
-
-  def change(self, vals, update):       # Redefined update handler
-    logger.debug('Update event: %s \nValues : %s' % (str(update), str(vals)))
-
-  def getOutput(self, userLang=False):  # Get result of 'yandex-disk status'
-    cmd = ['yandex-disk','-c', self.config.fileName, 'status']
-    if not userLang:      # Change locale settings when it required
-      cmd = ['env', '-i', "LANG='en_US.UTF8'"] + cmd
+  @staticmethod
+  def get(theme):                   # Icons of theme
+    theme = 'light' if theme else 'dark'
+    icons = Icons._cache.get(theme)
+    if icons is None:
+      icons = Icons._cache[theme] = Icons._resolve(theme)
+    if Icons._watchers is None:     # Watch changes in all icons directories
+      changed = Coalescer(Icons._changed, interval=500, leading=False)
+      Icons._watchers = []
+      for path in (installDir, configPath):
+        for name in ('light', 'dark'):
+          watcher = FileWatcher(changed.call)
+          watcher.start(pathJoin(path, 'icons', name, ''))
+          Icons._watchers.append(watcher)
+    return icons
+
+  @staticmethod
+  def _resolve(theme):              # Determine paths to icons according to theme
+    defaultPath = pathJoin(installDir, 'icons', theme)
+    userPath = pathJoin(configPath, 'icons', theme)
     try:
-      output = subprocess.check_output(cmd, universal_newlines=True)
-    except:
-      output = ''         # daemon is not running or bad
-    #logger.debug('output = %s' % output)
+      userIcons = set(os.listdir(userPath))
+    except OSError:
+      userIcons = set()
+    # Set appropriate paths to all status icons
+    icons = dict()
+    for status in ['idle', 'error', 'paused', 'none', 'no_net', 'busy']:
+      name = ('yd-ind-pause.png' if status in {'paused', 'none', 'no_net'} else
+              'yd-busy1.png' if status == 'busy' else
+              'yd-ind-'+status+'.png')
+      icons[status] = pathJoin(userPath if name in userIcons else defaultPath, name)
+    # Set theme paths of animation frames according to existence of first busy icon
+    themePath = userPath if 'yd-busy1.png' in userIcons else defaultPath
+    icons['frames'] = tuple(pathJoin(themePath, 'yd-busy%d.png' % n) for n in range(1, 6))
+    return icons
+
+  @staticmethod
+  def _changed():                   # Icons are changed (called by watchers)
+    logger.info('Icons are changed')
+    Icons._cache.clear()
+    for i in indicators:            # Update all indicators' icons
+      i.setIconTheme(config['theme'])
+      i._iconPath = None            # Icon file can be changed: set it anyway
+      i.updateIcon()
+
+class ProgressIcons(object):    # Icons with synchronization progress (shared by all indicators)
+  ''' Progress bar is drawn over the base icon (the current busy animation frame). Progress is
+      quantized by step percents, so icon is rendered once for each base icon and progress
+      bucket. Rendered icons are kept in the directory on tmpfs (XDG_RUNTIME_DIR when it is
+      available). Not more than size icons are kept, the least recently used ones are removed.
+      ProgressIcons class methods:
+        get   - Returns path to base icon with progress (in percents) overlay.
+        clear - Remove all rendered icons.
+  '''
+  step = 5                          # Progress bucket (%)
+  size = 32                         # Maximal number of rendered icons
+  _cache = OrderedDict()            # Rendered icons {(base, bucket): path} in order of usage
+  _dir = None                       # Directory of rendered icons
+  _count = 0                        # Number of rendered icons (for unique file names)
+
+  @staticmethod
+  def get(base, percent):           # Icon with progress overlay
+    cls = ProgressIcons
+    key = (base, min(int(percent) // cls.step * cls.step, 100))
+    path = cls._cache.get(key)
+    if path is not None:
+      cls._cache.move_to_end(key)   # Icon is the most recently used now
+      return path
+    path = cls._render(*key)
+    if path == base:
+      return base                   # Rendering failed: show base icon
+    cls._cache[key] = path
+    while len(cls._cache) > cls.size:
+      deleteFile(cls._cache.popitem(last=False)[1])
+    return path
+
+  @staticmethod
+  def _render(base, bucket):        # Draw progress bar over base icon
+    cls = ProgressIcons
+    try:
+      if cls._dir is None:
+        runDir = os.environ.get('XDG_RUNTIME_DIR', '/dev/shm')
+        cls._dir = mkdtemp(prefix='yd-tools-', dir=runDir if pathExists(runDir) else None)
+      icon = GdkPixbuf.Pixbuf.new_from_file(base)
+      width, height = icon.get_width(), icon.get_height()
+      barHeight = max(height // 6, 2)
+      # Bar background (semi-transparent) and filled part of bar
+      for color, barWidth in ((0x00000099, width), (0x3daee9ff, width * bucket // 100)):
+        if barWidth:
+          bar = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, barWidth, barHeight)
+          bar.fill(color)
+          bar.composite(icon, 0, height - barHeight, barWidth, barHeight, 0, height - barHeight,
+                        1, 1, GdkPixbuf.InterpType.NEAREST, 255)
+      cls._count += 1                 # New file name: indicator host may cache icon by path
+      path = pathJoin(cls._dir, 'progress%d.png' % cls._count)
+      icon.savev(path, 'png', [], [])
+    except (GLib.Error, OSError) as e:
+      logger.error('Progress icon rendering failed: %s' % str(e))
+      return base
+    return path
+
+  @staticmethod
+  def clear():                      # Remove rendered icons
+    ProgressIcons._cache.clear()
+    if ProgressIcons._dir is not None:
+      rmtree(ProgressIcons._dir, ignore_errors=True)
+      ProgressIcons._dir = None
+
+#### Main indicator classes
+class Indicator(YDDaemon):      # Yandex.Disk appIndicator
 
-    return output
+  _animated = set()                 # Indicators with animated busy icon
+  # Icon animation timer shared by all indicators (don't start it here)
+  _animation = Timer(777, lambda: Indicator._iconAnimation(), start=False)
 
-  def _parseOutput(self, out):          # Parse the daemon output
-    '''
-    It parses the daemon output and check that something changed from last daemon status.
-    The self.vals dictionary is updated with new daemon statuses and self.update set represents
-    the changes in self.vals. It returns True is something changed
-
-    Daemon status is converted form daemon raw statuses into internal representation.
-    Internal status can be on of the following: 'busy', 'idle', 'paused', 'none', 'no_net', 'error'.
-    Conversion is done by following rules:
-     - empty status (daemon is not running) converted to 'none'
-     - statuses 'busy', 'idle', 'paused' are passed 'as is'
-     - 'index' is ignored (previous status is kept)
-     - 'no internet access' converted to 'no_net'
-     - 'error' covers all other errors, except 'no internet access'
-    '''
-    self.update.reset()                     # Reset updates object
-    # Split output on two parts: list of named values and file list
-    output = out.split('Last synchronized items:')
-    if len(output) == 2:
-      files = output[1]
-    else:
-      files = ''
-    output = output[0].splitlines()
-    # Make a dictionary from named values (use only lines containing ':')
-    res = dict([re.findall(r'\s*(.+):\s*(.*)', l)[0] for l in output if ':' in l])
-    # Parse named status values
-    for srch, key in (('Synchronization core status', 'status'), ('Sync progress', 'progress'),
-                      ('Total', 'total'), ('Used', 'used'), ('Available', 'free'),
-                      ('Trash size', 'trash')):
-      val = res.get(srch, '')
-      if key == 'status':                   # Convert status to internal representation
-        #logger.debug('Raw status : \'%s\', previous status: %s'%(val, self.vals['status']))
-        # Store previous status
-        self.vals['laststatus'] = self.vals['status']
-        # Convert daemon raw status to internal representation
-        val = (# Convert '' into 'none' status
-               'none' if not val else
-               # Ignore index status
-               self.vals['laststatus'] if val == 'index' else
-               # Rename long error status
-               'no_net' if val == 'no internet access' else
-               # pass 'busy', 'idle' and 'paused' statuses 'as is'
-               val if val in ['busy', 'idle', 'paused'] else
-               # Status 'error' covers 'error', 'failed to connect to daemon process' and other.
-               'error')
-      elif key != 'progress' and not val:   # 'progress' can be '' the rest - can't
-        val = '...'                         # Make default filling for empty values
-      # Check value change and store changed
-      if self.vals[key] != val:             # Check change of value
-        self.vals[key] = val                # Store new value
-        if key == 'status':
-          self.update.stat = True           # Remember that status changed
-        elif key == 'progress':
-          self.update.prog = True           # Remember that progress cahnged
-        else:
-          self.update.size = True           # Remember that something changed in sizes values
-    # Parse last synchronized items
-    buf = re.findall(r".*: '(.*)'\n", files)
-    # Check if file list has been changed
-    if self.vals['lastitems'] != buf:
-      self.vals['lastitems'] = buf          # Store the new file list
-      self.update.last = True               # Remember that it is changed
-    return bool(self.update)
-
-  def _errorDialog(self, err):          # Show error messages according to the error
+  def __init__(self, path, ID, output=None):
+    indicatorName = "yandex-disk-%s"%ID[1:-1]
+    # Create indicator notification engine
+    self.notify = Notification(indicatorName, config['notifications'])
+    # Setup icons theme
+    self.setIconTheme(config['theme'])
+    # Create App Indicator
+    self._iconPath = self.icon['paused']          # Current icon
+    self.ind = appIndicator.Indicator.new(indicatorName, self._iconPath,
+                                          appIndicator.IndicatorCategory.APPLICATION_STATUS)
+    self.ind.set_status(appIndicator.IndicatorStatus.ACTIVE)
+    self.menu = self.Menu(self, ID)               # Create menu for daemon
+    self.ind.set_menu(self.menu)                  # Attach menu to indicator
+    # Initialize Yandex.Disk daemon connection object
+    super(Indicator, self).__init__(path, ID, *daemonOptions(config), output=output)
+
+  def _errorDialog(self, err):      # Show error messages according to the error
     global logo
     logger.error('Daemon initialization failed: %s', err)
     if err == 'NOCONFIG' or err == 'CANTSTART':
@@ -662,79 +278,8 @@ class YDDaemon(object):         # Yandex.Disk daemon interface
     dialog.destroy()
     return retCode              # 0 when error is not critical or fixed (daemon has been configured)
 
-  def start(self):                      # Execute 'yandex-disk start'
-    '''
-    Execute 'yandex-disk start' and return '' if success or error message if not
-    ... but sometime it starts successfully with error message
-    Additionally it starts iNotify monitoring in case of success start
-    '''
-    err = ''
-    while True:
-      try:                                          # Try to start
-        msg = subprocess.check_output(['yandex-disk', '-c', self.config.fileName, 'start'],
-                                      universal_newlines=True)
-        logger.info('Start success, message: %s' % msg)
-        err =  ''
-      except subprocess.CalledProcessError as e:
-        logger.error('Daemon start failed:%s' % e.output)
-        if e.output == '':                          # Probably 'os: no file'
-          return 'NOTINSTALLED'
-        err = ('NONET' if 'Proxy' in e.output else
-               'BADDAEMON' if 'daemon' in e.output else
-               'NOCONFIG' if "'dir'" in e.output or 'OAuth' in e.output else
-               err)
-      # Handle the starting error
-      if err != '' and self._errorDialog(err) == 0:
-        self.config.load()                          # Reload created configuration file & try again
-      else:
-        break
-    if err == '':
-      self.vals = YDDaemon._dvals.copy()            # Initialise default values
-      self._parseOutput(self.getOutput())           # Parse fresh daemon output
-      self.update.init = True                       # Remember that it is initial change event
-      self.vals['status'] = 'paused'                # Set current status to avoid index status
-      self.vals['laststatus'] = 'none'              # Set well known previous status
-      self.change(self.vals, self.update)           # Manually raise initial change event
-      self._iNtfyWatcher.start(self.config['dir'])  # Activate watcher with self.handler
-    return err
-
-  def stop(self):                       # Execute 'yandex-disk stop'
-    try:
-      msg = subprocess.check_output(['yandex-disk', '-c', self.config.fileName, 'stop'],
-                                    universal_newlines=True)
-    except:
-      msg = ''
-    if msg:
-      self._iNtfyWatcher.stop()
-      self._eventHandler(True)          # Manually call evetHanler to raise change event
-      return True
-    else:
-      return False
-
-  def exit(self):                       # Handle daemon/indicator closing
-    # Stop yandex-disk daemon if it is required by its configuration
-    if self.vals['status'] != 'none' and self.config.get('stoponexitfromindicator', False):
-      self.stop()
-      logger.info('Demon %sstopped'%self.ID)
-
-class Indicator(YDDaemon):      # Yandex.Disk appIndicator
-
-  def __init__(self, path, ID):
-    indicatorName = "yandex-disk-%s"%ID[1:-1]
-    # Create indicator notification engine
-    self.notify = Notification(indicatorName, config['notifications'])
-    # Setup icons theme
-    self.setIconTheme(config['theme'])
-    # Create timer object for icon animation support (don't start it here)
-    self.timer = Timer(777, self._iconAnimation, start=False)
-    # Create App Indicator
-    self.ind = appIndicator.Indicator.new(indicatorName, self.icon['paused'],
-                                          appIndicator.IndicatorCategory.APPLICATION_STATUS)
-    self.ind.set_status(appIndicator.IndicatorStatus.ACTIVE)
-    self.menu = self.Menu(self, ID)               # Create menu for daemon
-    self.ind.set_menu(self.menu)                  # Attach menu to indicator
-    # Initialize Yandex.Disk daemon connection object
-    super(Indicator, self).__init__(path, ID)
+  def abort(self, msg):             # Exit from application
+    appExit(msg)
 
   def change(self, vals, update):   # Redefinition of daemon class call-back function
     '''
@@ -742,66 +287,83 @@ class Indicator(YDDaemon):      # Yandex.Disk appIndicator
     status information in menu (status, sizes and list of last synchronized items).
     It is called when daemon detects any change of its status.
     '''
-    logger.info(self.ID + 'Change event: %s'%str(update))
+    logger.info('%sChange event: %s', self.ID, update)
     # Update information in menu
     self.menu.update(vals, update, self.config['dir'])
     # Handle daemon status change by icon change
     if update.stat or update.init:
       self.updateIcon()                   # Update icon
+    elif update.prog and self in Indicator._animated:
+      self.setIcon(self.busyIcon())       # Show new progress on the current frame
     # Create notifications for status change events
     if update.stat:
-      if vals['laststatus'] == 'none':    # Daemon has been started
+      if vals.laststatus == 'none':       # Daemon has been started
         self.notify.send(_('Yandex.Disk ')+self.ID, _('Yandex.Disk daemon has been started'))
-      if vals['status'] == 'busy':        # Just entered into 'busy'
+      if vals.status == 'busy':           # Just entered into 'busy'
         self.notify.send(_('Yandex.Disk ')+self.ID, _('Synchronization started'))
-      elif vals['status'] == 'idle':      # Just entered into 'idle'
-        if vals['laststatus'] == 'busy':  # ...from 'busy' status
+      elif vals.status == 'idle':         # Just entered into 'idle'
+        if vals.laststatus == 'busy':     # ...from 'busy' status
           self.notify.send(_('Yandex.Disk ')+self.ID, _('Synchronization has been completed'))
-      elif vals['status'] =='paused':     # Just entered into 'paused'
-        if vals['laststatus'] != 'none':  # ...not from 'none' status
+      elif vals.status =='paused':        # Just entered into 'paused'
+        if vals.laststatus != 'none':     # ...not from 'none' status
           self.notify.send(_('Yandex.Disk ')+self.ID, _('Synchronization has been paused'))
-      elif vals['status'] == 'none':      # Just entered into 'none' from some another status
+      elif vals.status == 'none':         # Just entered into 'none' from some another status
           self.notify.send(_('Yandex.Disk ')+self.ID, _('Yandex.Disk daemon has been stopped'))
       else:                               # status is 'error' or 'no-net'
         self.notify.send(_('Yandex.Disk ')+self.ID, _('Synchronization ERROR'))
 
-  def setIconTheme(self, theme):    # Determine paths to icons according to current theme
-    global installDir, configPath
-    theme = 'light' if theme else 'dark'
-    # Determine theme from application configuration settings
-    defaultPath = pathJoin(installDir, 'icons', theme)
-    userPath = pathJoin(configPath, 'icons', theme)
-    # Set appropriate paths to all status icons
-    self.icon = dict()
-    for status in ['idle', 'error', 'paused', 'none', 'no_net', 'busy']:
-      name = ('yd-ind-pause.png' if status in {'paused', 'none', 'no_net'} else
-              'yd-busy1.png' if status == 'busy' else
-              'yd-ind-'+status+'.png')
-      userIcon = pathJoin(userPath, name)
-      self.icon[status] = userIcon if pathExists(userIcon) else pathJoin(defaultPath, name)
-      # userIcon corresponds to busy icon on exit from this loop
-    # Set theme paths according to existence of first busy icon
-    self.themePath = userPath if pathExists(userIcon) else defaultPath
+  def configChange(self, keys):     # Handle daemon config changes made outside
+    logger.info(self.ID + 'Config change event: %s' % ', '.join(sorted(keys)))
+    if 'dir' in keys:                   # Daemon folder is moved: update folder related items
+      yddir = self.config.get('dir', '')
+      self.menu.setFolder(yddir)
+      # Paths of last synchronized items are changed
+      self.menu.update(self.vals, YDDaemon.UpdateEvent(StatusSnapshot.LASTITEMS), yddir)
+
+  def setIconTheme(self, theme):    # Get paths to icons according to current theme
+    self.icon = Icons.get(theme)
+
+  def setIcon(self, path):          # Change indicator icon (if it is really changed)
+    if path != self._iconPath:
+      self._iconPath = path
+      self.ind.set_icon(path)
+
+  def busyIcon(self):               # Current busy animation frame (with progress when it is known)
+    frame = self.icon['frames'][self._seqNum]
+    if self.vals.percent is None or not config['progressicon']:
+      return frame
+    return ProgressIcons.get(frame, self.vals.percent)
 
   def updateIcon(self):             # Change indicator icon according to just changed daemon status
-    # Set icon according to the current status
-    self.ind.set_icon(self.icon[self.vals['status']])
     # Handle animation
-    if self.vals['status'] == 'busy':   # Just entered into 'busy' status
-      self._seqNum = 2                  # Next busy icon number for animation
-      self.timer.start()                # Start animation timer
-    elif self.timer.active:
-      self.timer.stop()                 # Stop animation timer when status is not busy
-
-  def _iconAnimation(self):         # Changes busy icon by loop (triggered by self.timer)
-    # Set next animation icon
-    self.ind.set_icon(pathJoin(self.themePath, 'yd-busy' + str(self._seqNum) + '.png'))
-    # Calculate next icon number
-    self._seqNum = self._seqNum % 5 + 1   # 5 icon numbers in loop (1-2-3-4-5-1-2-3...)
-    return True                           # True required to continue triggering by timer
+    if self.vals.status == 'busy':      # Just entered into 'busy' status
+      self._seqNum = 0
+      self.setIcon(self.busyIcon())     # Set the first busy icon
+      self._seqNum = 1                  # Next busy icon frame for animation
+      Indicator._animated.add(self)     # Start animation
+      Indicator._animation.start()
+    else:
+      # Set icon according to the current status
+      self.setIcon(self.icon[self.vals.status])
+      Indicator._animated.discard(self) # Stop animation when status is not busy
+      if not Indicator._animated:
+        Indicator._animation.stop()
+
+  @staticmethod
+  def _iconAnimation():             # Changes busy icons by loop (triggered by shared timer)
+    for i in Indicator._animated:
+      # Set next animation icon
+      i.setIcon(i.busyIcon())
+      # Calculate next icon frame
+      i._seqNum = (i._seqNum + 1) % 5   # 5 icon frames in loop (0-1-2-3-4-0-1-2...)
+    return True                         # True required to continue triggering by timer
 
   class Menu(Gtk.Menu):             # Indicator menu
 
+    # Existence checks of last synchronized items (shared by all menus, run out of main loop)
+    _checker = ThreadPoolExecutor(max_workers=1)
+    refresh = 1000                              # Minimal interval between updates of open menu (ms)
+
     def __init__(self, daemon, ID):
       self.daemon = daemon                      # Store reference to daemon object for future usage
       Gtk.Menu.__init__(self)                   # Create menu
@@ -817,6 +379,9 @@ class Indicator(YDDaemon):      # Yandex.Disk appIndicator
       self.last = Gtk.MenuItem(_('Last synchronized items'))
       self.lastItems = Gtk.Menu()               # Sub-menu: list of last synchronized files/folders
       self.last.set_submenu(self.lastItems)     # Add submenu (empty at the start)
+      self._lastShown = []                      # Shown sub-menu items: [(file path, widget)]
+      self._lastPool = []                       # Hidden sub-menu items for reuse
+      self._lastCheck = 0                       # Number of the last requested existence check
       self.append(self.last)
       self.append(Gtk.SeparatorMenuItem.new())  # -----separator--------
       self.daemon_start = Gtk.MenuItem(_('Start Yandex.Disk daemon'))
@@ -826,6 +391,7 @@ class Indicator(YDDaemon):      # Yandex.Disk appIndicator
       self.daemon_stop.connect("activate", self.stopDaemon);
       self.append(self.daemon_stop)
       self.open_folder = Gtk.MenuItem(_('Open Yandex.Disk Folder'))
+      self._openFolder = None                   # Handler of open_folder activation
       self.append(self.open_folder)
       open_web = Gtk.MenuItem(_('Open Yandex.Disk on the web'))
       open_web.connect("activate", self.openInBrowser, _('https://disk.yandex.com'))
@@ -835,16 +401,17 @@ class Indicator(YDDaemon):      # Yandex.Disk appIndicator
       self.preferences.connect("activate", Preferences)
       self.append(self.preferences)
       open_help = Gtk.MenuItem(_('Help'))
-      m_help = Gtk.Menu()
-      help1 = Gtk.MenuItem(_('Yandex.Disk daemon'))
-      help1.connect("activate", self.openInBrowser, _('https://yandex.com/support/disk/'))
-      m_help.append(help1)
-      help2 = Gtk.MenuItem(_('Yandex.Disk Indicator'))
-      help2.connect("activate", self.openInBrowser,
-                    _('https://github.com/slytomcat/yandex-disk-indicator/wiki'))
-      m_help.append(help2)
-      open_help.set_submenu(m_help)
+      open_help.set_submenu(Gtk.Menu())         # Sub-menu is filled when it is opened first time
+      open_help.connect("activate", self.fillHelp)
       self.append(open_help)
+      if Profiler.enabled:                      # Timing summary of event pipeline stages
+        profile = Gtk.MenuItem(_('Profile'))
+        profile.set_submenu(Gtk.Menu())         # Sub-menu is filled when it is opened
+        profile.connect("activate", self.fillProfile)
+        self.append(profile)
+      diagnostics = Gtk.MenuItem(_('Save diagnostics'))
+      diagnostics.connect("activate", self.saveDiagnostics)
+      self.append(diagnostics)
       self.about = Gtk.MenuItem(_('About'));    self.about.connect("activate", self.openAbout)
       self.append(self.about)
       self.append(Gtk.SeparatorMenuItem.new())  # -----separator--------
@@ -855,55 +422,161 @@ class Indicator(YDDaemon):      # Yandex.Disk appIndicator
       # Define user readable statuses dictionary
       self.YD_STATUS = {'idle': _('Synchronized'), 'busy': _('Sync.: '), 'none': _('Not started'),
                         'paused': _('Paused'), 'no_net': _('Not connected'), 'error':_('Error') }
+      # Changes are applied to menu not more often than once per refresh interval (see update)
+      self._vals = None                         # The latest status values
+      self._yddir = ''                          # The latest daemon folder
+      self._changes = 0                         # Not applied changes (UpdateEvent mask)
+      self._refreshTimer = Timer(self.refresh, self._refresh, start=False)
+      self.last.connect("activate", self.apply)   # Sub-menu is about to be shown
 
     def update(self, vals, update, yddir):  # Update information in menu
+      '''
+      Changes are accumulated and applied not more often than once per refresh interval (the
+      menu is exported via dbusmenu, so its opening can't be detected reliably). Status changes
+      (they are rare) and initial event are applied at once. Accumulated changes are also
+      applied when last synchronized items sub-menu is about to be shown.'''
+      self._vals, self._yddir = vals, yddir
+      self._changes |= update.mask
+      if update.stat or update.init:
+        self._refreshTimer.stop()
+        self.apply()
+      else:
+        self._refreshTimer.start()              # Apply changes after refresh interval
+
+    def apply(self, widget=None):           # Apply accumulated changes to menu
+      if self._changes:
+        update, self._changes = YDDaemon.UpdateEvent(self._changes), 0
+        self._apply(self._vals, update, self._yddir)
+
+    def _refresh(self):                     # Apply accumulated changes (triggered by timer)
+      self._refreshTimer.stop()
+      self.apply()
+      return False
+
+    def _apply(self, vals, update, yddir):  # Update information in menu
       # Update status data
       if update.stat or update.prog or update.init:
-        logger.debug(vals['status']+self.YD_STATUS[vals['status']])
-        self.status.set_label(_('Status: ') + self.YD_STATUS[vals['status']] +
-                              (vals['progress'] if vals['status'] == 'busy' else ''))
+        logger.debug('%s %s', vals.status, self.YD_STATUS[vals.status])
+        self.status.set_label(_('Status: ') + self.YD_STATUS[vals.status] +
+                              (vals.progress + self.speed() if vals.status == 'busy' else ''))
       # Update sizes data
       if update.size or update.init:
-        self.used.set_label(_('Used: ') + vals['used'] + '/' + vals['total'])
-        self.free.set_label(_('Free: ') + vals['free'] + _(', trash: ') + vals['trash'])
+        self.used.set_label(_('Used: ') + vals.used + '/' + vals.total)
+        self.free.set_label(_('Free: ') + vals.free + _(', trash: ') + vals.trash)
       # Update last synchronized sub-menu when daemon is running
-      if (update.last or update.init) and vals['status'] != 'none':
-        for widget in self.lastItems.get_children():  # Clear last synchronized sub-menu
-          self.lastItems.remove(widget)
-        for filePath in vals['lastitems']:            # Create new sub-menu items
-          # Create menu label as file path (shorten it down to 50 symbols when path length > 50
-          # symbols), with replaced underscore (to disable menu acceleration feature of GTK menu).
-          widget = Gtk.MenuItem.new_with_label(
-                       (filePath[: 20] + '...' + filePath[-27: ] if len(filePath) > 50 else
-                        filePath).replace('_', u'\u02CD'))
-          filePath = pathJoin(yddir, filePath)        # Make full path to file
-          if pathExists(filePath):
-            widget.set_sensitive(True)                # If it exists then it can be opened
-            widget.connect("activate", self.openPath, filePath)
-          else:
-            widget.set_sensitive(False)               # Don't allow to open non-existing path
-          self.lastItems.append(widget)
-          widget.show()
-        if not vals['lastitems']:                     # No items in list?
+      if (update.last or update.init) and vals.status != 'none':
+        self.updateLast(vals.lastitems, yddir)
+        if not vals.lastitems:                        # No items in list?
           self.last.set_sensitive(False)
         else:                                         # There are some items in list
           self.last.set_sensitive(True)
         logger.debug("Sub-menu 'Last synchronized' has been updated")
       # Update 'static' elements of menu
-      if 'none' in (vals['status'], vals['laststatus']) or update.init:
-        started = vals['status'] != 'none'
+      if 'none' in (vals.status, vals.laststatus) or update.init:
+        started = vals.status != 'none'
         self.status.set_sensitive(started)
         self.daemon_stop.set_sensitive(started)
         self.daemon_start.set_sensitive(not started)
         self.last.set_sensitive(started)
-        if self.ID:                                   # Set daemon identity row in multidaemon mode
-          folder = (yddir.replace('_', u'\u02CD') if yddir else '< NOT CONFIGURED >')
-          self.yddir.set_label(self.ID + _('  Folder: ') + folder)
-        if yddir:                                     # Activate Open YDfolder if daemon configured
-          self.open_folder.connect("activate", self.openPath, yddir)
-          self.open_folder.set_sensitive(True)
-        else:
-          self.open_folder.set_sensitive(False)
+        self.setFolder(yddir)
+
+    def speed(self):                        # Synchronization speed and remaining time
+      throughput = self.daemon.throughput
+      if not throughput.rate:
+        return ''
+      return (', ' + _('%s/s') % formatSize(throughput.rate) +
+              ('' if throughput.eta is None else
+               ', ' + _('%s left') % str(datetime.timedelta(seconds=throughput.eta))))
+
+    def updateLast(self, items, yddir):     # Reconcile last synchronized sub-menu with items
+      '''
+      Widgets of items that are still in the list are kept (only moved to new positions), widgets
+      of removed items are hidden and reused for new items. Paths existence is checked by
+      _checker, until the result is received new items are not sensitive.'''
+      needed = dict()                                 # Number of items with the same path
+      for filePath in items:
+        needed[filePath] = needed.get(filePath, 0) + 1
+      shown = dict()                                  # Shown widgets to keep by file path
+      for filePath, widget in self._lastShown:
+        if needed.get(filePath):
+          needed[filePath] -= 1
+          shown.setdefault(filePath, []).append(widget)
+        else:                                         # Hide widget of removed item
+          widget.hide()
+          self._lastPool.append(widget)
+      self._lastShown = []
+      for pos, filePath in enumerate(items):
+        widgets = shown.get(filePath)
+        if widgets:                                   # Item is already shown
+          widget = widgets.pop(0)
+        else:                                         # New item
+          if self._lastPool:
+            widget = self._lastPool.pop()
+          else:
+            widget = Gtk.MenuItem()
+            widget.connect("activate", self.openLast)
+            self.lastItems.append(widget)
+          # Menu label is file path (shorten it down to 50 symbols when path length > 50
+          # symbols), with replaced underscore (to disable menu acceleration feature of GTK menu).
+          widget.set_label((filePath[: 20] + '...' + filePath[-27: ] if len(filePath) > 50 else
+                            filePath).replace('_', u'\u02CD'))
+          widget.set_sensitive(False)                 # Till existence check result
+          widget.show()
+        widget.filePath = pathJoin(yddir, filePath)   # Full path to file
+        self.lastItems.reorder_child(widget, pos)
+        self._lastShown.append((filePath, widget))
+      # Check paths existence out of main loop
+      self._lastCheck += 1
+      check = self._lastCheck
+      paths = [widget.filePath for filePath, widget in self._lastShown]
+      self._checker.submit(lambda: [pathExists(p) for p in paths]).add_done_callback(
+        lambda future: GLib.idle_add(self._lastChecked, check, future.result()))
+
+    def _lastChecked(self, check, exist):   # Apply existence check result (called in main loop)
+      if check == self._lastCheck:                    # Items weren't changed after check request
+        for (filePath, widget), exists in zip(self._lastShown, exist):
+          widget.set_sensitive(exists)                # Don't allow to open non-existing path
+      return False                                    # Call it only once
+
+    def openLast(self, widget):             # Open last synchronized item
+      self.openPath(widget, widget.filePath)
+
+    def setFolder(self, yddir):             # Update daemon folder items
+      if self.ID:                                   # Set daemon identity row in multidaemon mode
+        folder = (yddir.replace('_', u'\u02CD') if yddir else '< NOT CONFIGURED >')
+        self.yddir.set_label(self.ID + _('  Folder: ') + folder)
+      if self._openFolder is not None:
+        self.open_folder.disconnect(self._openFolder)
+        self._openFolder = None
+      if yddir:                                     # Activate Open YDfolder if daemon configured
+        self._openFolder = self.open_folder.connect("activate", self.openPath, yddir)
+        self.open_folder.set_sensitive(True)
+      else:
+        self.open_folder.set_sensitive(False)
+
+    def fillHelp(self, widget):             # Create Help sub-menu items
+      m_help = widget.get_submenu()
+      if m_help.get_children():
+        return                                  # Sub-menu is already filled
+      help1 = Gtk.MenuItem(_('Yandex.Disk daemon'))
+      help1.connect("activate", self.openInBrowser, _('https://yandex.com/support/disk/'))
+      m_help.append(help1)
+      help2 = Gtk.MenuItem(_('Yandex.Disk Indicator'))
+      help2.connect("activate", self.openInBrowser,
+                    _('https://github.com/slytomcat/yandex-disk-indicator/wiki'))
+      m_help.append(help2)
+      m_help.show_all()
+
+    def fillProfile(self, widget):          # Fill Profile sub-menu with p50/p99 of stages
+      m_profile = widget.get_submenu()
+      for item in m_profile.get_children():
+        m_profile.remove(item)
+      for stage, calls, p50, p99 in Profiler.summary() or [(_('No data'), 0, 0, 0)]:
+        item = Gtk.MenuItem(stage if not calls else
+                            _('%s: p50 %.2f ms, p99 %.2f ms (%d)') % (stage, p50, p99, calls))
+        item.set_sensitive(False)
+        m_profile.append(item)
+      m_profile.show_all()
 
     def openAbout(self, widget):            # Show About window
       global logo, indicators
@@ -980,6 +653,13 @@ class Indicator(YDDaemon):      # Yandex.Disk appIndicator
         except:
           subprocess.call(['xdg-open', path])
 
+    def saveDiagnostics(self, widget):      # Dump recent log records (see FlightRecorder)
+      path = recorder.dump()
+      if path:
+        notify.send(_('Yandex.Disk Indicator'), _('Diagnostics saved to %s') % path)
+      else:
+        notify.send(_('Yandex.Disk Indicator'), _('ERROR in saving of diagnostics'))
+
     def close(self, widget):                # Quit from indicator
       appExit()
 
@@ -1009,20 +689,22 @@ class Preferences(Gtk.Dialog):  # Preferences window of application and daemons
       view.append_column(Gtk.TreeViewColumn(_('Path'), Gtk.CellRendererText(), text=1))
       self.get_content_area().add(view)
       # Populate list with paths from "exclude-dirs" property of daemon configuration
-      for val in CVal(self.dconfig.get('exclude-dirs', None)):
+      for val in self.dconfig.excludes:
         self.excludeList.append([False, val])
       self.show_all()
 
     def exitFromDialog(self, widget):     # Save list from dialogue to "exclude-dirs" property
       if self.dconfig.changed:
-        exList = CVal()                                     # Store path value from dialogue rows
-        listIter = self.excludeList.get_iter_first()
-        while listIter != None:
-          exList.add(self.excludeList.get(listIter, 1)[0])
-          listIter = self.excludeList.iter_next(listIter)
-        self.dconfig['exclude-dirs'] = exList.get()         # Save collected value
+        self.dconfig.excludes = self.rowsIndex()            # Index path values from dialogue rows
+        self.dconfig['exclude-dirs'] = self.dconfig.excludes.value()  # Save collected value
       self.destroy()                                        # Close dialogue
 
+    def rowsIndex(self):                  # Make index of paths from dialogue rows
+      index = ExcludeIndex(root=self.dconfig.get('dir', ''))
+      for row in self.excludeList:
+        index.add(row[1])
+      return index
+
     def lineToggled(self, widget, path):  # Line click handler, it switch row selection
       self.excludeList[path][0] = not self.excludeList[path][0]
 
@@ -1044,8 +726,12 @@ class Preferences(Gtk.Dialog):  # Preferences window of application and daemons
       rootDir = self.dconfig['dir']
       dialog.set_current_folder(rootDir)
       if dialog.run() == Gtk.ResponseType.ACCEPT:
-        self.excludeList.append([False, os.path.relpath(dialog.get_filename(), start=rootDir)])
-        self.dconfig.changed = True
+        path = os.path.relpath(dialog.get_filename(), start=rootDir)
+        if path in self.rowsIndex():                        # Folder or its parent is in list
+          logger.debug('Folder %s is already excluded' % path)
+        else:
+          self.excludeList.append([False, path])
+          self.dconfig.changed = True
       dialog.destroy()
 
   def __init__(self, widget):
@@ -1066,6 +752,7 @@ class Preferences(Gtk.Dialog):  # Preferences window of application and daemons
     for key, msg in [('autostart', _('Start Yandex.Disk indicator when you start your computer')),
                      ('notifications', _('Show on-screen notifications')),
                      ('theme', _('Prefer light icon theme')),
+                     ('progressicon', _('Show synchronization progress on icon')),
                      ('fmextensions', _('Activate file manager extensions'))]:
       cb.append(Gtk.CheckButton(msg))
       cb[-1].set_active(config[key])
@@ -1138,9 +825,9 @@ class Preferences(Gtk.Dialog):  # Preferences window of application and daemons
     else:
       config.changed = True                     # Update application config
       config[key] = toggleState
-    if key == 'theme':
+    if key in ('theme', 'progressicon'):
         for i in indicators:                    # Update all indicators' icons
-          i.setIconTheme(toggleState)           # Update icon theme
+          i.setIconTheme(config['theme'])       # Update icon theme
           i.updateIcon()                        # Update current icon
     elif key == 'notifications':
       notify.switch(toggleState)                # Update application notification engine
@@ -1190,39 +877,133 @@ class LockFile(object):         # LockFile
     deleteFile(self.fileName)
     logger.debug('Lock file %s successfully deleted.' % self.fileName)
 
+def setDefaults(config):        # Set default values of application config
+  # Setup on-screen notification settings from config value
+  config.setdefault('notifications', True)
+  config.setdefault('theme', False)
+  config.setdefault('progressicon', True)
+  config.setdefault('fmextensions', True)
+  config.setdefault('daemons', '~/.config/yandex-disk/config.cfg')
+  # iNotify events coalescing: minimal interval and maximal staleness (ms), leading/trailing call
+  config.setdefault('eventinterval', '500')
+  config.setdefault('eventmaxwait', '2000')
+  config.setdefault('eventleading', True)
+  config.setdefault('eventtrailing', True)
+  # Status polling policy (linear, exponential, status or jittered) and its maximal intervals (ms)
+  config.setdefault('pollpolicy', 'linear')
+  config.setdefault('pollmax', '10000')
+  config.setdefault('pollidlemax', '60000')
+
+def appConfigChange():         # Apply application config changes made outside
+  new = Config(config.fileName, load=False)
+  if not new.load():
+    return                      # Config is being replaced: wait for the next event
+  setDefaults(new)              # Removed values return to their defaults
+  # Auto-start is defined by existence of auto-start file, not by the config value
+  keys = {k for k in set(config) | set(new) if k != 'autostart' and new.get(k) != config.get(k)}
+  if not keys:
+    return                      # Nothing changed (e.g. config saved by ourselves)
+  logger.info('Config changed: %s' % ', '.join(sorted(keys)))
+  for k in keys:
+    if k in new:
+      config[k] = new[k]
+    else:                       # Removed value without default (e.g. metricsfile)
+      del config[k]
+  if keys & {'theme', 'progressicon'}:
+    for i in indicators:        # Update all indicators' icons
+      i.setIconTheme(config['theme'])
+      i.updateIcon()
+  if 'notifications' in keys:
+    notify.switch(config['notifications'])
+    for i in indicators:
+      i.notify.switch(config['notifications'])
+  if 'fmextensions' in keys and not activateActions():
+    notify.send(_('Yandex.Disk Indicator'), _('ERROR in setting up of file manager extensions'))
+  if keys & {'eventinterval', 'eventmaxwait', 'eventleading', 'eventtrailing',
+             'pollpolicy', 'pollmax', 'pollidlemax'}:
+    for i in indicators:
+      i.setOptions(*daemonOptions(config))
+  if 'metricsfile' in keys:
+    YDDaemon.exporter.setPath(metricsFile(config))
+  if 'daemons' in keys:
+    logger.warning('Changed daemons list will be used after the indicator restart')
+
 def appExit(msg = None):        # Exit from application (it closes all indicators)
   for i in indicators:
     i.exit()
+  ProgressIcons.clear()
   flock.release()
   sys.exit(msg)
 
+fileManagers = ('nautilus', 'nemo', 'thunar', 'dolphin', 'pantheon-files')
+
+def installedFMs():             # Detect installed file managers
+  '''
+  Returns dictionary {file manager package: True if it is installed} or None when package
+  manager is not supported. Packages are checked concurrently, the result is cached in
+  <configPath>/fm.cache till the package database modification.'''
+  # Package manager: (command, command to check package, package database path)
+  for name, cmd, db in (('dpkg', ['dpkg', '-s'], '/var/lib/dpkg/status'),
+                        ('rpm', ['rpm', '-qi'], '/var/lib/rpm'),
+                        ('pacman', ['pacman', '-Qi'], '/var/lib/pacman/local'),
+                        ('zypper', ['zypper', 'info'], '/var/lib/rpm'),
+                        ('emerge', ['emerge', '-pv'], '/var/db/pkg')):
+    if which(name):
+      logger.info("%s detected" % name)
+      break
+  else:
+    logger.info("Your package manager is not supported. Installing FM extensions is not possible.")
+    return None
+  try:
+    dbTime = str(int(os.stat(db).st_mtime))
+  except OSError:
+    dbTime = ''
+  cacheFile = pathJoin(configPath, 'fm.cache')
+  cache = Config(cacheFile, load=pathExists(cacheFile))
+  if dbTime and cache.get('pm') == name and cache.get('dbtime') == dbTime:
+    logger.debug('Installed file managers are taken from cache')
+    return {fm: cache.get(fm, False) for fm in fileManagers}
+  def check(fm):                # Check that package is installed
+    return subprocess.call(cmd + [fm], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+  with ThreadPoolExecutor(max_workers=len(fileManagers)) as pool:
+    res = dict(zip(fileManagers, pool.map(check, fileManagers)))
+  cache.clear()
+  cache.update(res, pm=name, dbtime=dbTime)
+  cache.save()
+  return res
+
+def ucaAction(ucaPath, name, action=None):  # Add (or remove when action is None) Thunar action
+  try:
+    with open(ucaPath, 'rt') as f:
+      buf = f.read()
+  except OSError:
+    logger.error('Thunar actions file read error: %s' % ucaPath)
+    return False
+  if action is None:            # Remove action
+    buf = re.sub(r'<action><icon>[^<]*</icon><name>"%s"</name>.*?</action>' % re.escape(name),
+                 '', buf, flags=re.S)
+  elif '"%s"' % name not in buf:  # Add action if it is not added yet
+    buf = buf.replace('</actions>', action + '</actions>')
+  else:
+    return True
+  try:
+    with open(ucaPath, 'wt') as f:
+      f.write(buf)
+  except OSError:
+    logger.error('Thunar actions file write error: %s' % ucaPath)
+    return False
+  return True
+
 def activateActions():          # Install/deinstall file extensions
   activate = config["fmextensions"]
   result = False
 
-  # Package manager check
-  if subprocess.call("hash dpkg>/dev/null 2>&1", shell=True)==0:
-    logger.info("dpkg detected")
-    pm = 'dpkg -s '
-  elif subprocess.call("hash rpm>/dev/null 2>&1", shell=True)==0:
-    logger.info("rpm detected")
-    pm = 'rpm -qi '
-  elif subprocess.call("hash pacman>/dev/null 2>&1", shell=True)==0:
-    logger.info("Pacman detected")
-    pm = 'pacman -Qi '
-  elif subprocess.call("hash zypper>/dev/null 2>&1", shell=True)==0:
-    logger.info("Zypper detected")
-    pm = 'zypper info '
-  elif subprocess.call("hash emerge>/dev/null 2>&1", shell=True)==0:
-    logger.info("Emerge detected")
-    pm = 'emerge -pv '
-  else:
-    logger.info("Your package manager is not supported. Installing FM extensions is not possible.")
+  fms = installedFMs()          # Installed file managers
+  if fms is None:
     return result
   # --- Actions for Nautilus ---
-  ret = subprocess.call([pm + "nautilus>/dev/null 2>&1"], shell=True)
-  logger.info("Nautilus installed: %s" % str(ret == 0))
-  if ret == 0:
+  logger.info("Nautilus installed: %s" % str(fms['nautilus']))
+  if fms['nautilus']:
     ver = subprocess.check_output(["lsb_release -r | sed -n '1{s/[^0-9]//g;p;q}'"], shell=True)
     if ver != '' and int(ver) < 1210:
       nautilusPath = ".gnome2/nautilus-scripts/"
@@ -1246,9 +1027,8 @@ def activateActions():          # Install/deinstall file extensions
       except:
         pass
   # --- Actions for Nemo ---
-  ret = subprocess.call([pm + "nemo>/dev/null 2>&1"], shell=True)
-  logger.info("Nemo installed: %s" % str(ret == 0))
-  if ret == 0:
+  logger.info("Nemo installed: %s" % str(fms['nemo']))
+  if fms['nemo']:
     if activate:        # Install actions for Nemo
       try:
         copyFile(pathJoin(installDir, "fm-actions/Nautilus_Nemo/publish"),
@@ -1266,55 +1046,39 @@ def activateActions():          # Install/deinstall file extensions
       except:
         pass
   # --- Actions for Thunar ---
-  ret = subprocess.call([pm + "thunar>/dev/null 2>&1"], shell=True)
-  logger.info("Thunar installed: %s" % str(ret == 0))
-  if ret == 0:
+  logger.info("Thunar installed: %s" % str(fms['thunar']))
+  if fms['thunar']:
     ucaPath = pathJoin(userHome, ".config/Thunar/uca.xml")
     if activate:        # Install actions for Thunar
-      try:
-        if subprocess.call(["grep '" + _("Publish via Yandex.Disk") + "' " +
-                            ucaPath + " >/dev/null 2>&1"],
-                           shell=True) != 0:
-          subprocess.call(["sed", "-i", "s/<\/actions>/<action><icon>folder-publicshare<\/icon>" +
-                         '<name>"' + _("Publish via Yandex.Disk") +
-                         '"<\/name><command>yandex-disk publish %f | xclip -filter -selection' +
-                         ' clipboard; zenity --info ' +
-                         '--window-icon=\/usr\/share\/yd-tools\/icons\/yd-128.png ' +
-                         '--title="Yandex.Disk" --ok-label="' + _('Close') + '" --text="' +
-                         _('URL to file: %f was copied into clipboard.') +
-                         '"<\/command><description><\/description><patterns>*<\/patterns>' +
-                         '<directories\/><audio-files\/><image-files\/><other-files\/>' +
-                         "<text-files\/><video-files\/><\/action><\/actions>/g", ucaPath])
-        if subprocess.call(["grep '" + _("Unpublish from Yandex.disk") + "' " +
-                            ucaPath + " >/dev/null 2>&1"],
-                            shell=True) != 0:
-          subprocess.call(["sed", "-i", "s/<\/actions>/<action><icon>folder<\/icon><name>\"" +
-                         _("Unpublish from Yandex.disk") +
-                         '"<\/name><command>zenity --info ' +
-                         '--window-icon=\/usr\/share\/yd-tools\/icons\/yd-128_g.png --ok-label="' +
-                         _('Close') + '" --title="Yandex.Disk" --text="' +
-                         _("Unpublish from Yandex.disk") +
-                         ': \`yandex-disk unpublish %f\`"<\/command>' +
-                         '<description><\/description><patterns>*<\/patterns>' +
-                         '<directories\/><audio-files\/><image-files\/><other-files\/>' +
-                         "<text-files\/><video-files\/><\/action><\/actions>/g", ucaPath])
-        result = True
-      except:
-        pass
+      result = (ucaAction(ucaPath, _("Publish via Yandex.Disk"),
+                          '<action><icon>folder-publicshare</icon><name>"' +
+                          _("Publish via Yandex.Disk") +
+                          '"</name><command>yandex-disk publish %f | xclip -filter -selection' +
+                          ' clipboard; zenity --info ' +
+                          '--window-icon=/usr/share/yd-tools/icons/yd-128.png ' +
+                          '--title="Yandex.Disk" --ok-label="' + _('Close') + '" --text="' +
+                          _('URL to file: %f was copied into clipboard.') +
+                          '"</command><description></description><patterns>*</patterns>' +
+                          '<directories/><audio-files/><image-files/><other-files/>' +
+                          '<text-files/><video-files/></action>') and
+                ucaAction(ucaPath, _("Unpublish from Yandex.disk"),
+                          '<action><icon>folder</icon><name>"' +
+                          _("Unpublish from Yandex.disk") +
+                          '"</name><command>zenity --info ' +
+                          '--window-icon=/usr/share/yd-tools/icons/yd-128_g.png --ok-label="' +
+                          _('Close') + '" --title="Yandex.Disk" --text="' +
+                          _("Unpublish from Yandex.disk") +
+                          ': `yandex-disk unpublish %f`"</command>' +
+                          '<description></description><patterns>*</patterns>' +
+                          '<directories/><audio-files/><image-files/><other-files/>' +
+                          '<text-files/><video-files/></action>')) or result
     else:               # Remove actions for Thunar
-      try:
-        subprocess.call(["sed", "-i", "s/<action><icon>.*<\/icon><name>\"" +
-                         _("Publish via Yandex.Disk") + "\".*<\/action>//", ucaPath])
-        subprocess.call(["sed", "-i", "s/<action><icon>.*<\/icon><name>\"" +
-                         _("Unpublish from Yandex.disk") + "\".*<\/action>//", ucaPath])
-        result = True
-      except:
-        pass
+      result = (ucaAction(ucaPath, _("Publish via Yandex.Disk")) and
+                ucaAction(ucaPath, _("Unpublish from Yandex.disk"))) or result
 
   # --- Actions for Dolphin ---
-  ret = subprocess.call([pm + "dolphin>/dev/null 2>&1"], shell=True)
-  logger.info("Dolphin installed: %s" % str(ret == 0))
-  if ret == 0:
+  logger.info("Dolphin installed: %s" % str(fms['dolphin']))
+  if fms['dolphin']:
     if activate:        # Install actions for Dolphin
       try:
         makedirs(pathJoin(userHome, '.local/share/kservices5/ServiceMenus'))
@@ -1330,9 +1094,8 @@ def activateActions():          # Install/deinstall file extensions
       except:
         pass
   # --- Actions for Pantheon-files ---
-  ret = subprocess.call([pm + "pantheon-files>/dev/null 2>&1"], shell=True)
-  logger.info("Pantheon-files installed: %s" % str(ret == 0))
-  if ret == 0:
+  logger.info("Pantheon-files installed: %s" % str(fms['pantheon-files']))
+  if fms['pantheon-files']:
     ctrs_path = "/usr/share/contractor/"
     if activate:        # Install actions for Pantheon-files
       src_path = pathJoin(installDir, "fm-actions", "pantheon-files")
@@ -1373,6 +1136,17 @@ def argParse():                 # Parse command line arguments
   group.add_argument('-r', '--remove', dest='rcfg', metavar='path', default='',
             help=_('Path to configuration file of daemon that should be removed' +
                    ' from daemos list. Default: \'\''))
+  group.add_argument('--headless', action='store_true',
+            help=_('Monitor daemons without GUI (status changes are logged). Only -l, -c, ' +
+                   '--profile and --record-level options are used in this mode'))
+  group.add_argument('--startup-profile', action='store_true', dest='startup',
+            help=_('Print wall time of startup phases and exit after the indicators are shown'))
+  group.add_argument('--profile', type=int, nargs='?', const=60, metavar='sec',
+            help=_('Print timing summary of event pipeline stages every sec seconds and show ' +
+                   'it in the menu. Default: 60'))
+  group.add_argument('--record-level', type=int, choices=range(10, 60, 10), dest='record',
+            default=20, help=_('Sets the level of messages kept by in-memory flight recorder ' +
+                   'and saved to diagnostics (10 - to keep debugging messages). Default: 20'))
   group.add_argument('-h', '--help', action='help', help=_('Show this help message and exit'))
   group.add_argument('-v', '--version', action='version', version='%(prog)s v.' + appVer,
             help=_('Print version and exit'))
@@ -1414,30 +1188,48 @@ if __name__ == '__main__':
 
   # Get command line arguments or their default values
   args = argParse()
+  profile = StartupProfile(startTime)
+  profile.phase('Imports and arguments')
 
   # Set user specified logging level
   logger.setLevel(args.level)
+  # Recent records (of record level and above) are dumped on error, from menu or by SIGUSR1
+  recorder = FlightRecorder(pathJoin(configPath, 'flight.log'), level=args.record)
+  recorder.install(logger)
+  GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1, lambda: recorder.dump() or True)
 
   # Report app version and logging level
   logger.info('%s v.%s' % (appName, appVer))
   logger.debug('Logging level: '+str(args.level))
 
+  # Probes of event pipeline stages are installed before the stages are used
+  if args.profile:
+    Profiler.enable()
+    Profiler.instrument(Indicator, 'change')
+    Profiler.instrument(Indicator.Menu, 'update')       # Accumulation of changes
+    Profiler.instrument(Indicator.Menu, '_apply')       # Widgets update
+    Profiler.instrument(Notification, '_message', 'Notification.send')
+    Timer(args.profile * 1000, Profiler.dump)   # Periodic summary
+
   # Application configuration
   '''
   User configuration is stored in ~/.config/<appHomeName>/<appName>.conf file.
   This file can contain comments (line starts with '#') and config values in
   form: key=value[,value[,value ...]] where keys and values can be quoted ("...") or not.
   The following key words are reserved for configuration:
-    autostart, notifications, theme, fmextensions and daemons.
+    autostart, notifications, theme, progressicon, fmextensions, daemons, eventinterval,
+    eventmaxwait, eventleading, eventtrailing, pollpolicy, pollmax, pollidlemax and metricsfile.
 
   The dictionary 'config' stores the config settings for usage in code. Its values are saved to
   config file on exit from the Menu.Preferences dialogue or when there is no configuration file
-  when application starts.
+  when application starts. Changes of config file made outside are applied on the fly (except
+  the daemons list).
 
   Note that daemon settings ('dir', 'read-only', 'overwrite' and 'exclude_dir') are stored
   in ~/ .config/yandex-disk/config.cfg file. They are read in YDDaemon.__init__() method
   (in dictionary YDDaemon.config). Their values are saved to daemon config file also
-  on exit from Menu.Preferences dialogue.
+  on exit from Menu.Preferences dialogue. Daemon config file changes made outside are reloaded
+  automatically (see YDDaemon.configChange).
 
   Additionally 'startonstartofindicator' and 'stoponexitfromindicator' values are added into daemon
   configuration file to provide the functionality of obsolete 'startonstart' and 'stoponexit'
@@ -1446,11 +1238,7 @@ if __name__ == '__main__':
   config = Config(pathJoin(configPath, appName + '.conf'))
   # Read some settings to variables, set default values and update some values
   config['autostart'] = checkAutoStart(autoStartDst)
-  # Setup on-screen notification settings from config value
-  config.setdefault('notifications', True)
-  config.setdefault('theme', False)
-  config.setdefault('fmextensions', True)
-  config.setdefault('daemons', '~/.config/yandex-disk/config.cfg')
+  setDefaults(config)
   # Is it a first run?
   if not config.readSuccess:
     logging.info('No config, probably it is a first run.')
@@ -1472,8 +1260,8 @@ if __name__ == '__main__':
       except:
         logger.error('Can\'t activate indicator automatic start on system start-up')
 
-    # Activate FM actions according to config (as it is first run)
-    activateActions()
+    # Activate FM actions according to config (as it is first run) when main loop is started
+    GLib.idle_add(lambda: activateActions() and False)  # False: call it only once
     # Save config with default settings
     config.save()
 
@@ -1497,15 +1285,32 @@ if __name__ == '__main__':
 
   # Check for already running instance of the indicator application with the same config
   flock = LockFile(pathJoin(configPath, 'pid'))
+  profile.phase('Configuration')
 
+  # Get initial statuses of all daemons concurrently
+  paths = [d.replace('~', userHome) for d in daemons]
+  outputs = YDDaemon.probe(paths)
+  profile.phase('Daemons status')
   # Make indicator objects for each daemon in daemons list
+  YDDaemon.sessionLog = pathJoin(configPath, 'sessions.log')  # Log of synchronization sessions
+  YDDaemon.exporter = MetricsExporter(metricsFile(config))    # Prometheus metrics exporter
   indicators = []
-  for d in daemons:
-    indicators.append(Indicator(d.replace('~', userHome),
-                                _('#%d ')%len(indicators) if len(daemons) > 1 else ''))
+  for d in paths:
+    indicators.append(Indicator(d, _('#%d ')%len(indicators) if len(daemons) > 1 else '',
+                                outputs[d]))
+  profile.phase('Indicators')
 
   # Notification engine for application messages (it is used in Preferences dialogue)
   notify = Notification(appName, config['notifications'])
+  # Application config changes made outside are applied when the file writing is finished
+  cfgWatcher = FileWatcher(Coalescer(appConfigChange, interval=500, leading=False).call)
+  cfgWatcher.start(config.fileName)
 
+  if args.startup:          # Exit after the first main loop iteration (indicators are shown)
+    GLib.idle_add(Gtk.main_quit)
   # Start GTK Main loop
   Gtk.main()
+  profile.phase('First main loop iteration')
+  print(profile.report())
+  ProgressIcons.clear()
+  flock.release()
@@ -0,0 +1,1982 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  Yandex.Disk indicator core: daemon monitoring without GUI
+#
+#  Copyright 2014+ Sly_tom_cat <slytomcat@mail.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#  This module doesn't import any GI bindings. The GUI application replaces the main loop
+#  interface (see 'loop' below) by GLib. Without GUI the module can be run as headless
+#  monitor of daemons: python3 ydcore.py [-l <level>] [-c <path to daemon config>]
+
+import os, sys, subprocess, pyinotify, logging, re, argparse, time, random, selectors, signal
+from collections import deque
+from array import array
+from functools import lru_cache
+from bisect import bisect_left
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+from os.path import exists as pathExists, join as pathJoin
+from shutil import copy as fileCopy, copymode
+
+logger = logging.getLogger('')
+userHome = os.getenv("HOME")
+
+#### Main loop
+class MainLoop(object):         # Minimal main loop with GLib compatible interface
+  ''' MainLoop provides the subset of GLib interface that is used by core classes:
+        timeout_add   - Call handler(*args) every interval ms while it returns True.
+        io_add_watch  - Call handler(fd, condition, *args) when fd is readable while handler
+                        returns True.
+        source_remove - Remove timer or fd watch by its id.
+      run and quit methods start and stop the loop. quit wakes the waiting loop up via the
+      internal pipe, so it takes effect immediately (e.g. when it is called by signal handler).
+  '''
+  PRIORITY_DEFAULT = 0
+  IO_IN = 1
+  IO_HUP = 16
+
+  def __init__(self):
+    self._selector = selectors.DefaultSelector()
+    self._timers = dict()             # id: [due time, interval, handler, args]
+    self._watches = dict()            # id: (fd, handler, args)
+    self._id = 0                      # Last source id
+    self._running = False
+    self._wakeup = os.pipe()          # Pipe to wake up the waiting loop (see quit)
+    for fd in self._wakeup:
+      os.set_blocking(fd, False)
+    self._selector.register(self._wakeup[0], selectors.EVENT_READ, None)
+
+  def timeout_add(self, interval, handler, *args):
+    self._id += 1
+    self._timers[self._id] = [time.monotonic() + interval / 1000, interval, handler, args]
+    return self._id
+
+  def io_add_watch(self, fd, priority, condition, handler, *args):
+    self._id += 1
+    self._watches[self._id] = (fd, handler, args)
+    self._selector.register(fd, selectors.EVENT_READ, self._id)
+    return self._id
+
+  def source_remove(self, sourceId):
+    if self._timers.pop(sourceId, None) is None:
+      watch = self._watches.pop(sourceId, None)
+      if watch is not None:
+        self._selector.unregister(watch[0])
+
+  def run(self):                      # Run loop until quit is called
+    self._running = True
+    while self._running:
+      due = min((t[0] for t in self._timers.values()), default=None)
+      timeout = None if due is None else max(due - time.monotonic(), 0)
+      for key, mask in self._selector.select(timeout):
+        if key.data is None:          # Wake up call
+          try:
+            os.read(key.fd, 512)
+          except BlockingIOError:
+            pass
+          continue
+        watch = self._watches.get(key.data)
+        if watch is not None and not watch[1](watch[0], self.IO_IN, *watch[2]):
+          self.source_remove(key.data)
+      now = time.monotonic()
+      for sourceId, timer in list(self._timers.items()):
+        if timer[0] <= now and sourceId in self._timers:
+          if timer[2](*timer[3]):
+            timer[0] = now + timer[1] / 1000
+          else:
+            self._timers.pop(sourceId, None)
+
+  def quit(self):
+    self._running = False
+    try:
+      os.write(self._wakeup[1], b'\0')
+    except BlockingIOError:
+      pass                            # Pipe is full: the loop is woken up anyway
+
+loop = MainLoop()               # Main loop interface (GUI replaces it by GLib)
+
+#### Common utility functions and classes
+def copyFile(src, dst):
+  try:
+    fileCopy (src, dst)
+  except:
+    logger.error("File Copy Error: from %s to %s" % (src, dst))
+
+def deleteFile(dst):
+  try:
+    os.remove(dst)
+  except:
+    logger.error('File Deletion Error: %s' % dst)
+
+def makedirs(dst):
+  try:
+    os.makedirs(dst, exist_ok=True)
+  except:
+    logger.error('Dirs creation Error: %s' % dst)
+
+class CVal(object):             # Multivalue helper
+  ''' Class to work with value that can be None, scalar item or list of items depending
+      of number of elementary items added to it. '''
+
+  def __init__(self, initialValue=None):
+    self.set(initialValue)   # store initial value
+    self.index = None
+
+  def get(self):                  # It just returns the current value of cVal
+    return self.val
+
+  def set(self, value):           # Set internal value
+    self.val = value
+    if isinstance(self.val, list) and len(self.val) == 1:
+      self.val = self.val[0]
+    return self.val
+
+  def add(self, item):            # Add item
+    if isinstance(self.val, list):  # Is it third, fourth ... value?
+      self.val.append(item)         # Just append new item to list
+    elif self.val is None:          # Is it first item?
+      self.val = item               # Just store item
+    else:                           # It is the second item.
+      self.val = [self.val, item]   # Convert scalar value to list of items.
+    return self.val
+
+  def remove(self, item):
+    if isinstance(self.val, list):
+      self.val.remove(item)
+      if len(self.val) == 1:
+        self.val = self.val[0]
+    elif self.val is None:
+      raise ValueError
+    else:
+      if self.val == item:
+        self.val = None
+      else:
+        raise ValueError
+    return self.val
+
+  def __iter__(self):             # cVal iterator object initialization
+    if isinstance(self.val, list):  # Is CVal a list?
+      self.index = -1
+    elif self.val is None:          # Is CVal not defined?
+      self.index = None
+    else:                           # CVal is scalar type.
+      self.index = -2
+    return self
+
+  def __next__(self):             # cVal iterator support
+    if self.index is None:            # Is CVal not defined?
+      raise StopIteration             # Stop iterations
+    self.index += 1
+    if self.index >= 0:               # Is CVal a list?
+      if self.index < len(self.val):  # Is there a next element in list?
+        return self.val[self.index]
+      else:                           # There is no more elements in list.
+        self.index = None
+        raise StopIteration           # Stop iterations
+    else:                             # CVal has scalar type.
+      self.index = None               # Remember that there is no more iterations possible
+      return self.val
+
+  def __str__(self):              # String representation of CVal
+    return str(self.val)
+
+  def __getitem__(self, index):   # Access to cVal items by index
+    if isinstance(self.val, list):
+      return self.val[index]          # It raises IndexError when index is out of range(len(cVal))
+    elif self.val is None:
+      raise IndexError                # None value cannot be received by any index
+    elif not index:                   # cVal is scalar and index is 0?
+      return self.val
+    else:
+      raise IndexError
+
+  def __len__(self):              # Length of cVal
+    if isinstance(self.val, list):
+      return len(self.val)
+    return 0 if self.val is None else 1
+
+  def __contains__(self, item):   # 'in' opertor function
+    if isinstance(self.val, list):
+      return item in self.val
+    elif self.val is None:
+      return item is None
+    else:
+      return self.val == item
+
+  def __bool__(self):
+    return self.val is not None
+
+class ExcludeIndex(object):     # Index of excluded directories
+  ''' Path prefix trie of directories from 'exclude-dirs' daemon config value. Paths are stored
+      relative to the daemon folder (root): '~' is expanded, absolute paths inside root are made
+      relative, './', '..' and redundant slashes are normalised. Nested entries are not stored
+      as child of excluded directory is already excluded.
+      ExcludeIndex class methods:
+        __init__  - build index from value (None, path or list of paths) relative to root.
+        add       - Add path. Returns False when path (or its ancestor) is already excluded.
+                    Already stored descendants of added path are removed.
+        remove    - Remove path. Returns False when path is not stored.
+        excluded  - Returns True when path or any of its ancestors is excluded. The check
+                    takes O(depth of path). The 'in' operator does the same.
+        normalise - Returns normalised path.
+        value     - Returns stored paths as config value (None, path or list of paths).
+      Iteration over the index gives the stored paths in sorted order, len() - their number.
+  '''
+  _end = None                         # Key of excluded directory mark in trie node
+
+  def __init__(self, dirs=None, root=''):
+    self.root = ''
+    self.root = self.normalise(root)  # Absolute path of daemon folder or ''
+    self._trie = dict()               # {name: {name: ..., _end: True}, ...}
+    self._len = 0                     # Number of stored paths
+    for d in CVal(dirs):
+      self.add(d)
+
+  def normalise(self, path):          # Relative to root path without redundant parts
+    path = path.strip()
+    if path.startswith('~'):
+      path = userHome + path[1:]
+    if os.path.isabs(path) and self.root:
+      rel = os.path.relpath(path, self.root)
+      if not rel.startswith('..'):    # Path is inside root
+        path = rel
+    path = os.path.normpath(path) if path else ''
+    return '' if path == '.' else path
+
+  def _parts(self, path):             # Path components (absolute path starts with '')
+    path = self.normalise(path)
+    return path.split('/') if path else []
+
+  @staticmethod
+  def _count(node):                   # Number of excluded directories in sub-trie
+    return sum(1 if k is ExcludeIndex._end else ExcludeIndex._count(v) for k, v in node.items())
+
+  def add(self, path):                # Add path (not nested ones)
+    parts = self._parts(path)
+    if not parts:
+      return False
+    node = self._trie
+    for p in parts:
+      if self._end in node:
+        return False                  # Ancestor is already excluded
+      node = node.setdefault(p, dict())
+    if self._end in node:
+      return False                    # Path is already excluded
+    self._len -= self._count(node)    # Descendants are covered by new path
+    node.clear()
+    node[self._end] = True
+    self._len += 1
+    return True
+
+  def remove(self, path):             # Remove stored path
+    parts = self._parts(path)
+    nodes = [self._trie]
+    for p in parts:
+      node = nodes[-1].get(p)
+      if node is None:
+        return False
+      nodes.append(node)
+    if not parts or self._end not in nodes[-1]:
+      return False
+    del nodes[-1][self._end]
+    self._len -= 1
+    for p, node in zip(reversed(parts), reversed(nodes[:-1])):  # Remove empty branch
+      if node[p]:
+        break
+      del node[p]
+    return True
+
+  def excluded(self, path):           # Is path or its ancestor excluded?
+    node = self._trie
+    for p in self._parts(path):
+      if self._end in node:
+        return True
+      node = node.get(p)
+      if node is None:
+        return False
+    return self._end in node
+
+  __contains__ = excluded
+
+  def value(self):                    # Config value representation
+    return CVal(list(self) or None).get()
+
+  def __iter__(self):                 # Stored paths (sorted)
+    res = []
+    stack = [(self._trie, [])]
+    while stack:
+      node, parts = stack.pop()
+      if self._end in node:
+        res.append('/'.join(parts))
+      stack.extend((v, parts + [k]) for k, v in node.items() if k is not self._end)
+    return iter(sorted(res))
+
+  def __len__(self):
+    return self._len
+
+class Config(dict):             # Configuration
+
+  rawKeys = ()                      # Keys which values are not decoded (kept as strings)
+
+  def __init__(self, fileName, load=True,
+               bools=[['true', 'yes', 'y'], ['false', 'no', 'n']],
+               boolval=['yes', 'no'], usequotes=True, delimiter='='):
+    #super(Config, self).__init__(self)
+    self.fileName = fileName
+    self.bools = bools             # Values to detect boolean in self.load
+    self.boolval = boolval         # Values to write boolean in self.save
+    self.usequotes = usequotes     # Use quotes for keys and values in self.save
+    self.delimiter = delimiter     # Use specified delimiter between key and value
+    self.changed = False           # Change flag (for use outside of the class)
+    if load:
+      self.load()
+
+  def decode(self, value):              # Convert string to value before store it
+    #logger.debug("Decoded value: '%s'"%value)
+    if value.lower() in self.bools[0]:
+      value = True
+    elif value.lower() in self.bools[1]:
+      value = False
+    return value
+
+  # Value item (quoted or not) followed by comma or end of string. Item can be empty.
+  _itemRe = re.compile(r'\s*(?:"([^"]*)"|([~/.\w-]+))?\s*(,|$)')
+  _keyRe = re.compile(r'"([\w-]+)"$|^([\w-]+)$')    # Key (quoted or not)
+
+  def getValue(self, st, decode=True):  # Parse value(s) from string after '='
+    res = CVal()
+    pos = 0
+    while True:                         # Single pass through the comma separated items
+      item = self._itemRe.match(st, pos)
+      if item is None:
+        return None                                   # Something wrong in values string
+      quoted, word, sep = item.groups()
+      if quoted is not None:                          # decode vales with removed quotes
+        res.add(self.decode(quoted) if decode else quoted)
+      elif word is not None:
+        res.add(self.decode(word) if decode else word)
+      if not sep:                                     # End of string is reached
+        return res.get()
+      pos = item.end()
+
+  def load(self, bools=[['true', 'yes', 'y'], ['false', 'no', 'n']], delimiter='='):
+    """
+    Reads config file to dictionary (OrderedDict).
+    Config file should contain key=value rows.
+    Key can be quoted or not.
+    Value can be one item or list of comma-separated items. Each value item can be quoted or not.
+    When value is a single item then it creates key:value item in dictionary
+    When value is a list of items it creates key:[value, value,...] dictionary's item.
+    """
+    self.bools = bools
+    self.delimiter = delimiter
+    try:                              # Read configuration file into list of tuples ignoring blank
+                                      # lines, lines without delimiter, and lines with comments.
+      lineRe = re.compile(r'^\s*(.+?)\s*%s\s*(.*)$' % re.escape(self.delimiter))
+      with open(self.fileName) as cf:
+        res = [lineRe.match(l).groups()
+               for l in cf if l and self.delimiter in l and l.lstrip()[0] != '#']
+      self.readSuccess = True
+    except:
+      logger.error('Config file read error: %s' % self.fileName)
+      self.readSuccess = False
+      return False
+    for kv, vv in res:        # Parse each line
+      # Check key
+      key = self._keyRe.search(kv)
+      if not key:
+        logger.warning('Wrong key in line \'%s %s %s\'' % (kv, self.delimiter, vv))
+      else:                           # Key is OK
+        key = key.group(1) or key.group(2)  # Two possible keys variants (with and without quotes)
+        if not vv.strip():
+          logger.warning('No value specified in line \'%s %s %s\'' % (kv, self.delimiter, vv))
+        else:                         # Value is not empty
+          value = self.getValue(vv, key not in self.rawKeys)  # Parse values
+          if value is None:
+            logger.warning('Wrong value(s) in line \'%s %s %s\'' % (kv, self.delimiter, vv))
+          else:                       # Value is OK
+            if key in self.keys():    # Check duble values
+              logger.warning(('Double values for one key:\n%s = %s\nand\n%s = %s\n' +
+                              'Last one is stored.') % (key,self[key],key,value))
+            self[key] = value         # Store correct value
+            logger.debug('Config value read as: %s = %s', key, value)
+    logger.info('Config read: %s', self.fileName)
+    return True
+
+  def encode(self, val):                # Convert value to string before save it
+    if isinstance(val, bool):       # Treat Boolean
+      val = self.boolval[0] if val else self.boolval[1]
+    if self.usequotes:
+      val = '"' + val + '"'         # Put value within quotes
+    return val
+
+  def save(self, boolval=['yes', 'no'], usequotes=True, delimiter='=', values=None):
+    '''
+    Updates config file with values from dictionary (or from values dictionary when it is
+    specified). The file is parsed once into the index of key lines, only lines of keys which
+    values differ are rewritten (value None removes the key line). Updated file is written to
+    temporary file and then it replaces the config file (the target of symlinked config file).
+    Nothing is written when file content is not changed.
+    '''
+    self.usequotes = usequotes
+    self.boolval = boolval
+    self.delimiter = delimiter
+    try:                                  # Read the file in lines
+      with open(self.fileName, 'rt') as cf:
+        buf = cf.read()
+    except:
+      logger.warning('Config file access error, a new file (%s) will be created' % self.fileName)
+      buf = ''
+    lines = buf.splitlines()
+    while lines and not lines[-1]:        # Remove ending blank lines
+      lines.pop()
+    # Index of lines with values: {key: [(line number, value string)]}
+    keyRe = re.compile(r'^[ \t]*"?([\w-]+)"?[ \t]*%s[ \t]*(.+)$' % re.escape(self.delimiter))
+    index = dict()
+    for n, line in enumerate(lines):
+      key = keyRe.match(line)
+      if key:
+        index.setdefault(key.group(1), []).append((n, key.group(2)))
+    for key, value in (self if values is None else values).items():
+      if value is None:
+        res = None                        # Remove 'key=value' from file if value is None
+        logger.debug('Config value \'%s\' will be removed' % key)
+      else:                               # Make a line with value
+        res = ''.join([key, self.delimiter,
+                       ', '.join([self.encode(val) for val in CVal(value)])])
+        logger.debug('Config value to save: %s' % res)
+      if key in index:                    # Value has been found: replace its changed line(s)
+        for n, val in index[key]:
+          if res is None or self.getValue(val, key not in self.rawKeys) != value:
+            lines[n] = res
+      elif res is not None:               # Value was not found and value is not empty
+        lines.append(res)                 # Add new value to end of file
+    newBuf = ''.join(line + '\n' for line in lines if line is not None)
+    if newBuf == buf:
+      logger.debug('Config file is not changed: %s' % self.fileName)
+      self.changed = False
+      return True
+    realName = os.path.realpath(self.fileName)  # Symlinked config is updated via the link
+    tmpName = realName + '.tmp'
+    try:
+      with open(tmpName, 'wt') as cf:
+        cf.write(newBuf)                  # Write updated lines to temporary file
+        cf.flush()
+        os.fsync(cf.fileno())
+      if buf:
+        copymode(realName, tmpName)       # Keep file permissions
+      os.replace(tmpName, realName)       # Replace config file atomically
+    except:
+      logger.error('Config file write error: %s' % self.fileName)
+      try:
+        os.remove(tmpName)                # Don't leave partially written file
+      except OSError:
+        pass
+      return False
+    logger.info('Config written: %s' % self.fileName)
+    self.changed = False
+    return True
+
+class Timer(object):            # Timer for triggering a function periodically
+  ''' Timer class methods:
+        __init__ - initialize the timer object with specified interval and handler. Start it
+                   if start value is not False. par - is parameter for handler call.
+        start    - Start timer. Optionally the new interval can be specified and if timer is
+                   already running then the interval is updated (timer restarted with new interval).
+        update   - Updates interval. If timer is running it is restarted with new interval. It it
+                   is not running - then interval just stored.
+        stop     - Stop running timer or do nothing if it is not running.
+      Interface variables:
+        active   - True when timer is currently running
+  '''
+  def __init__(self, interval, handler, par = None, start = True):
+    self.interval = interval          # Timer interval (ms)
+    self.handler = handler            # Handler function
+    self.par = par                    # Parameter of handler function
+    self.active = False               # Current activity status
+    if start:
+      self.start()                    # Start timer if required
+
+  def start(self, interval = None):   # Start inactive timer or update if it is active
+    if interval is None:
+      interval = self.interval
+    if not self.active:
+      self.interval = interval
+      if self.par is None:
+        self.timer = loop.timeout_add(interval, self.handler)
+      else:
+        self.timer = loop.timeout_add(interval, self.handler, self.par)
+      self.active = True
+      #logger.debug('timer started %s %s' %(self.timer, interval))
+    else:
+      self.update(interval)
+
+  def update(self, interval):         # Update interval (restart active, not start if inactive)
+    if interval != self.interval:
+      self.interval = interval
+      if self.active:
+        self.stop()
+        self.start()
+
+  def stop(self):                     # Stop active timer
+    if self.active:
+      #logger.debug('timer to stop %s' %(self.timer))
+      loop.source_remove(self.timer)
+      self.active = False
+
+class SlotTimer(Timer):         # Timer that shares one loop timer with other SlotTimers
+  ''' SlotTimer has the same interface as Timer, but all SlotTimers are served by one main
+      loop timer. Due times are rounded up to the time slot (slot ms), so handlers of several timers
+      that become due within one slot are called by one wakeup. Wakeups are counted in
+      SlotTimer.wakeups.
+  '''
+  slot = 500                          # Time slot (ms)
+  wakeups = 0                         # Number of shared loop timer wakeups
+  _timers = set()                     # Active SlotTimers
+  _source = None                      # Shared loop timer
+  _wakeAt = None                      # Due slot of shared loop timer (ms)
+
+  def start(self, interval = None):   # Start inactive timer or update if it is active
+    if interval is None:
+      interval = self.interval
+    if not self.active:
+      self.interval = interval
+      self._due = self._now() + interval
+      self.active = True
+      SlotTimer._timers.add(self)
+      SlotTimer._schedule()
+    else:
+      self.update(interval)
+
+  def stop(self):                     # Stop active timer
+    if self.active:
+      self.active = False
+      SlotTimer._timers.discard(self)
+      SlotTimer._schedule()
+
+  @staticmethod
+  def _now():                         # Current time (ms)
+    return int(time.monotonic() * 1000)
+
+  @staticmethod
+  def _schedule():                    # (Re)schedule shared loop timer to the earliest due slot
+    if SlotTimer._timers:
+      due = min(t._due for t in SlotTimer._timers)
+      due = -(-due // SlotTimer.slot) * SlotTimer.slot    # Round up to slot
+    else:
+      due = None
+    if due != SlotTimer._wakeAt:
+      if SlotTimer._source is not None:
+        loop.source_remove(SlotTimer._source)
+        SlotTimer._source = None
+      if due is not None:
+        SlotTimer._source = loop.timeout_add(max(due - SlotTimer._now(), 0), SlotTimer._tick)
+      SlotTimer._wakeAt = due
+
+  @staticmethod
+  def _tick():                        # Call handlers of all due timers
+    SlotTimer._source = SlotTimer._wakeAt = None
+    SlotTimer.wakeups += 1
+    now = SlotTimer._now()
+    for t in [t for t in SlotTimer._timers if t._due <= now + SlotTimer.slot // 2]:
+      due = t._due
+      if not (t.handler() if t.par is None else t.handler(t.par)):
+        t.stop()
+      elif t.active and t._due == due:  # Timer was not restarted by handler
+        t._due = now + t.interval
+    SlotTimer._schedule()
+    return False
+
+class Coalescer(object):        # Coalescing of bursts of events
+  ''' Coalescer passes bursts of events to the handler as a few handler calls.
+      Coalescer class methods:
+        __init__ - initialize the coalescer with handler (and its parameter par), minimal
+                   interval between handler calls and maximal staleness of event (both in ms).
+                   leading - call handler on the first event of burst immediately,
+                   trailing - call handler when burst is over (there were no events during
+                   interval) if some events were not passed to handler yet.
+        call     - Register event. It has to be used as event handler.
+        flush    - Call handler immediately if there are some events not passed to it yet.
+        setup    - Change interval, maxwait, leading and trailing parameters.
+      Not passed events never wait longer than maxwait even when burst is not over.
+      Interface variables:
+        events   - number of registered events
+        calls    - number of handler calls
+  '''
+  def __init__(self, handler, par=None, interval=500, maxwait=2000, leading=True, trailing=True):
+    self.handler = handler            # Handler function
+    self.par = par                    # Parameter of handler function
+    self.events = 0                   # Number of registered events
+    self.calls = 0                    # Number of handler calls
+    self._first = None                # Time of first not passed event or None
+    self._timer = Timer(interval, self._quiet, start=False)
+    self.setup(interval, maxwait, leading, trailing)
+
+  def setup(self, interval=500, maxwait=2000, leading=True, trailing=True):  # Change parameters
+    self._timer.update(interval)      # Minimal interval between handler calls (ms)
+    self.maxwait = maxwait / 1000     # Maximal staleness of not passed event (sec)
+    self.leading = leading            # Call handler on the first event of burst
+    self.trailing = trailing          # Call handler on the end of burst
+
+  def call(self, *args):              # Register event (arguments of event are ignored)
+    self.events += 1
+    now = time.monotonic()
+    if not self._timer.active and self.leading:   # First event of burst
+      self._fire()
+    else:
+      if self._first is None:
+        self._first = now             # Remember the time of the first not passed event
+      elif now - self._first >= self.maxwait:
+        self._fire()                  # Not passed event became too stale
+    self._timer.stop()                # (Re)start the burst end waiting
+    self._timer.start()
+
+  def flush(self):                    # Pass not passed events immediately
+    if self._first is not None:
+      self._fire()
+
+  def _quiet(self):                   # There were no events during interval (burst is over)
+    self._timer.stop()
+    if self.trailing:
+      self.flush()
+    self._first = None
+    return False
+
+  def _fire(self):                    # Call handler
+    self._first = None
+    self.calls += 1
+    if self.par is None:
+      self.handler()
+    else:
+      self.handler(self.par)
+
+class PollScheduler(object):    # Status polling intervals
+  ''' Scheduler calculates intervals between status polls according to the policy:
+        linear      - 2, 3, 4 ... sec up to maxInt, the interval is kept in 'busy' status.
+        exponential - 2, 4, 8 ... sec up to maxInt, the interval is kept in 'busy' status.
+        status      - as linear, but up to idleInt in 'none', 'no_net' and 'paused' statuses
+                      and 2 sec in 'busy' status.
+        jittered    - as exponential with random +/-25% deviation of each interval (it spreads
+                      polls of several daemons in time).
+      PollScheduler class methods:
+        __init__ - initialize the scheduler with policy, base, maximal interval (in 'busy' and
+                   'idle' statuses) and maximal interval in inactive statuses (all in ms).
+        reset    - Returns interval after an iNotify event (it restarts the interval growth).
+        next     - Returns interval after a timer poll with specified current status.
+        stats    - Returns dictionary with polling statistics.
+        setup    - Change policy and maximal intervals (statistics are kept).
+  '''
+  policies = ('linear', 'exponential', 'status', 'jittered')
+
+  def __init__(self, policy='linear', base=2000, maxInt=10000, idleInt=60000):
+    self.base = base                  # Initial interval (ms)
+    self.interval = base              # Current interval (ms)
+    self.setup(policy, maxInt, idleInt)
+    self._cnt = 0                     # Number of timer polls after last reset
+    self.polls = 0                    # Number of timer polls
+    self.events = 0                   # Number of iNotify events
+    self._started = time.monotonic()
+
+  def setup(self, policy='linear', maxInt=10000, idleInt=60000):  # Change policy and intervals
+    if policy not in self.policies:
+      logger.warning('Unknown polling policy \'%s\', \'linear\' is used.' % policy)
+      policy = 'linear'
+    self.policy = policy
+    self.maxInt = maxInt              # Maximal interval (ms)
+    self.idleInt = idleInt            # Maximal interval in inactive statuses (ms)
+
+  def reset(self):                    # Interval after iNotify event
+    self.events += 1
+    self._cnt = 0
+    self.interval = self.base
+    return self.interval
+
+  def next(self, status):             # Interval after timer poll
+    self.polls += 1
+    if status == 'busy':
+      if self.policy == 'status':
+        self._cnt = 0
+        self.interval = self.base
+      return self.interval            # Keep interval in 'busy' status
+    self._cnt += 1
+    if self.policy in ('linear', 'status'):
+      interval = self.base + (self._cnt - 1) * 1000
+    else:
+      interval = self.base << min(self._cnt - 1, 16)
+    maxInt = (self.idleInt if self.policy == 'status' and status in ('none', 'no_net', 'paused')
+              else self.maxInt)
+    self.interval = min(interval, maxInt)
+    if self.policy == 'jittered':
+      self.interval = int(self.interval * random.uniform(.75, 1.25))
+    return self.interval
+
+  def stats(self):                    # Polling statistics
+    hours = max(time.monotonic() - self._started, 1) / 3600
+    return {'policy': self.policy, 'interval': self.interval, 'polls': self.polls,
+            'events': self.events, 'pollsPerHour': round(self.polls / hours, 1)}
+
+class FileWatcher(object):      # iNotify watcher of file changes
+  ''' FileWatcher calls handler (with parameter par) when the watched file is modified, created,
+      replaced (moved into place) or removed. The directory of file is watched (not the file
+      itself), so watching continues after the file rotation or atomic replacement. Path that
+      ends with '/' means any file in the directory. All watchers share one iNotify instance
+      which file descriptor is watched by the main loop, so watchers wake up only when some
+      events are really available. Wakeups are counted in FileWatcher.wakeups.
+      FileWatcher class methods:
+        __init__    - initialize the watcher with handler and its parameter par.
+        start       - Start watching of specified file (restart when it is already watched).
+        stop        - Stop watching.
+        wakeupsRate - Returns average number of iNotify wakeups per hour.
+      Interface variables:
+        path        - watched file path or None
+  '''
+  _mask = (pyinotify.IN_MODIFY | pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO |
+           pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM)
+  _watchMngr = None                   # Shared watch manager
+  _iNotifier = None                   # Shared PyiNotifier
+  _ioWatch = None                     # Loop source of iNotify fd watching
+  _dirs = dict()                      # Watched dirs: {dir: [watch descriptor, {name: [watchers]}]}
+  wakeups = 0                         # Number of iNotify handler calls
+  _started = time.monotonic()         # Start time of wakeups counting
+
+  def __init__(self, handler, par=None):
+    self._handler = handler
+    self._par = par
+    self.path = None
+    if FileWatcher._watchMngr is None:            # Initialize shared iNotify watcher
+      class _EH(pyinotify.ProcessEvent):          # Event handler class for iNotifier
+        def process_default(self, event):
+          d = FileWatcher._dirs.get(event.path)
+          if d:                                   # Watchers of file and of any file in dir
+            for watcher in d[1].get(event.name, []) + d[1].get('', []):
+              watcher._handler(watcher._par)
+      FileWatcher._watchMngr = pyinotify.WatchManager()  # Create watch manager
+      # Create PyiNotifier
+      FileWatcher._iNotifier = pyinotify.Notifier(FileWatcher._watchMngr, _EH())
+
+  @staticmethod
+  def _iNhandle(fd, condition):       # iNotify working routine (called by loop on fd input)
+    FileWatcher.wakeups += 1
+    FileWatcher._iNotifier.read_events()
+    FileWatcher._iNotifier.process_events()
+    return True
+
+  @staticmethod
+  def wakeupsRate():                  # Average number of wakeups per hour
+    return FileWatcher.wakeups * 3600 / max(time.monotonic() - FileWatcher._started, 1)
+
+  def start(self, path):              # Activate iNotify watching
+    cls = FileWatcher
+    if self.path is not None:
+      self.stop()
+    self.path = path
+    dirPath, name = os.path.split(path)
+    if dirPath not in cls._dirs:                  # Add watch of new directory
+      wdd = cls._watchMngr.add_watch(dirPath, cls._mask, rec=False)
+      cls._dirs[dirPath] = [wdd.get(dirPath), dict()]
+    cls._dirs[dirPath][1].setdefault(name, []).append(self)
+    # Activate iNotify fd watching in main loop
+    if cls._ioWatch is None:
+      cls._ioWatch = loop.io_add_watch(cls._watchMngr.get_fd(), loop.PRIORITY_DEFAULT,
+                                       loop.IO_IN, cls._iNhandle)
+
+  def stop(self):                     # Stop iNotify watching
+    cls = FileWatcher
+    if self.path is None:
+      return
+    dirPath, name = os.path.split(self.path)
+    self.path = None
+    wd, names = cls._dirs[dirPath]
+    names[name].remove(self)
+    if not names[name]:
+      del names[name]
+    if not names:                                 # Nothing is watched in directory
+      del cls._dirs[dirPath]
+      if wd is not None and wd >= 0:
+        cls._watchMngr.rm_watch(wd)
+    # Stop iNotify fd watching when nothing is watched
+    if not cls._dirs and cls._ioWatch is not None:
+      loop.source_remove(cls._ioWatch)
+      cls._ioWatch = None
+
+class StatusSnapshot(object):   # Immutable daemon status values
+  ''' Daemon status values at some moment. Snapshot can't be changed after creation, so it can be
+      passed to handlers, stored and shared between threads without copying.
+      StatusSnapshot class methods:
+        __init__ - create snapshot from status values (see fields). Numeric values of sizes are
+                   parsed once here.
+        replace  - Returns new snapshot with some values replaced.
+        diff     - Returns bit mask of fields that differ in other snapshot (see field bits).
+      Interface variables (read only):
+        status     - daemon status: 'busy', 'idle', 'paused', 'none', 'no_net', 'error' or ''
+        progress   - synchronization progress or ''
+        laststatus - previous daemon status
+        total, used, free, trash - sizes as they are shown by daemon or '...'
+        lastitems  - tuple of last synchronized items
+        sizes      - tuple of total, used, free and trash sizes in bytes (None when unknown)
+        percent    - synchronization progress in percents (float) or None
+        transfer   - synchronization progress in bytes: tuple (done, total) or None
+      Snapshots with equal values (excluding laststatus) are equal.
+  '''
+  fields = ('status', 'progress', 'total', 'used', 'free', 'trash', 'lastitems')
+  __slots__ = fields + ('laststatus', 'sizes', 'percent', 'transfer')
+  # Field bits of diff mask
+  STATUS, PROGRESS, TOTAL, USED, FREE, TRASH, LASTITEMS = (1 << i for i in range(len(fields)))
+  SIZES = TOTAL | USED | FREE | TRASH
+  # Size value like '2.14 GB' and multipliers of its units
+  _sizeRe = re.compile(r'\s*(\d+(?:[.,]\d+)?)\s*([KMGTP]?B)\s*$', re.I)
+  _units = {'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30, 'TB': 1 << 40, 'PB': 1 << 50}
+  # Progress value like '12.5 MB/ 40 MB (31 %)': done, total and percents
+  _percentRe = re.compile(r'\((\d+(?:[.,]\d+)?)\s*%\)')
+  _transferRe = re.compile(r'\s*([^/]+?)\s*/\s*([^(]+?)\s*(?:\(|$)')
+
+  def __init__(self, status='', progress='', total='...', used='...', free='...', trash='...',
+               lastitems=(), laststatus=''):
+    setValue = object.__setattr__
+    for name, value in zip(self.fields, (status, progress, total, used, free, trash,
+                                         tuple(lastitems))):
+      setValue(self, name, value)
+    setValue(self, 'laststatus', laststatus)
+    setValue(self, 'sizes', (self._size(total), self._size(used), self._size(free),
+                             self._size(trash)))
+    match = self._percentRe.search(progress)
+    setValue(self, 'percent', float(match.group(1).replace(',', '.')) if match else None)
+    match = self._transferRe.match(progress)
+    transfer = match and (self._size(match.group(1)), self._size(match.group(2)))
+    setValue(self, 'transfer', transfer if transfer and None not in transfer else None)
+
+  @staticmethod
+  @lru_cache(maxsize=64)
+  def _size(value):                   # Number of bytes in size value or None (sizes change rarely)
+    match = StatusSnapshot._sizeRe.match(value)
+    if match is None:
+      return None
+    return int(float(match.group(1).replace(',', '.')) *
+               StatusSnapshot._units[match.group(2).upper()])
+
+  def __setattr__(self, name, value):
+    raise AttributeError('StatusSnapshot is read only')
+
+  __delattr__ = __setattr__
+
+  def _values(self):                  # Values of compared fields
+    return tuple(getattr(self, name) for name in self.fields)
+
+  def replace(self, **values):        # New snapshot with replaced values
+    vals = dict(zip(self.fields, self._values()), laststatus=self.laststatus)
+    vals.update(values)
+    return StatusSnapshot(**vals)
+
+  def diff(self, other):              # Bit mask of changed fields
+    mask = 0
+    for bit, name in enumerate(self.fields):
+      if getattr(self, name) != getattr(other, name):
+        mask |= 1 << bit
+    return mask
+
+  def __eq__(self, other):
+    return isinstance(other, StatusSnapshot) and self._values() == other._values()
+
+  def __hash__(self):
+    return hash(self._values())
+
+  def __repr__(self):
+    return 'StatusSnapshot(%s, laststatus=%r)' % (
+             ', '.join('%s=%r' % (n, v) for n, v in zip(self.fields, self._values())),
+             self.laststatus)
+
+def formatSize(size):           # Human readable size (bytes) like daemon shows it
+  for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+    if size < 1024 or unit == 'TB':
+      break
+    size /= 1024
+  return ('%d %s' if unit == 'B' else '%.1f %s') % (size, unit)
+
+class Throughput(object):       # Synchronization speed and remaining time estimator
+  ''' Estimator is fed by status snapshots (see StatusSnapshot.transfer), the speed is smoothed
+      by exponentially weighted moving average (weight of the new measure is 1/2**shift). It
+      uses integer arithmetic only.
+      Throughput class methods:
+        update - Take into account the progress of snapshot received at time now (ms,
+                 monotonic time by default). Snapshot without progress resets estimation.
+        reset  - Reset estimation.
+      Interface variables:
+        rate   - synchronization speed (bytes per second) or None
+        eta    - remaining time of current transfer (seconds) or None
+  '''
+  def __init__(self, shift=2):
+    self.shift = shift                # Weight of new measure is 1/2**shift
+    self.reset()
+
+  def reset(self):                    # Reset estimation
+    self.rate = None                  # Smoothed speed (bytes/s)
+    self.eta = None                   # Remaining time (s)
+    self._last = None                 # Previous measure: (time (ms), done bytes, total bytes)
+
+  def update(self, vals, now=None):   # Account progress of new snapshot
+    if vals.transfer is None:
+      self.reset()
+      return
+    if now is None:
+      now = time.monotonic_ns() // 1000000
+    done, total = vals.transfer
+    if self._last is not None:
+      lastTime, lastDone, lastTotal = self._last
+      if total == lastTotal and done >= lastDone and now > lastTime:  # The same transfer
+        speed = (done - lastDone) * 1000 // (now - lastTime)
+        self.rate = speed if self.rate is None else self.rate + ((speed - self.rate) >> self.shift)
+      # Otherwise new transfer is started: measure it from now, keep the rate as an estimation
+    self._last = (now, done, total)
+    self.eta = (total - done) // self.rate if self.rate else None
+
+class StatusHistory(object):    # Bounded history of daemon statuses and synchronization sessions
+  ''' History keeps the last size records (time, status, done bytes of transfer, used bytes) in
+      the ring buffer of preallocated arrays, so memory usage doesn't depend on uptime. Values
+      that are unknown are stored as -1.
+      Synchronization session is the span from entering 'busy' status till 'idle' status (it is
+      dropped when daemon is stopped). Finished sessions (start time, duration (s), transferred
+      bytes, average speed (bytes/s)) are kept in sessions (not more than 16 last ones) and
+      appended to the log file (when it is specified) as tab separated line with name of
+      daemon. The log file is rotated to <logFile>.1 when its size exceeds logSize.
+      StatusHistory class methods:
+        add     - Record status snapshot received at time now (wall clock time by default).
+                  Returns finished session or None.
+      Iteration over history gives the records from the oldest one, len() - their number.
+  '''
+  statuses = ('', 'none', 'idle', 'busy', 'paused', 'no_net', 'error')
+
+  def __init__(self, name='', size=512, logFile=None, logSize=1 << 20):
+    self.name = name                  # Daemon name in session log
+    self.size = size
+    self.logFile = logFile
+    self.logSize = logSize
+    self._time = array('d', [0]) * size         # Record time
+    self._status = array('b', [0]) * size       # Index of status in statuses
+    self._done = array('q', [0]) * size         # Done bytes of current transfer
+    self._used = array('q', [0]) * size         # Used bytes
+    self._pos = 0                     # Position of the next record
+    self._len = 0                     # Number of records
+    self.sessions = deque(maxlen=16)  # Last finished sessions
+    self._session = None              # Current session: [start, bytes, done, total]
+
+  def add(self, vals, now=None):      # Record snapshot
+    if now is None:
+      now = time.time()
+    done, total = vals.transfer or (-1, -1)
+    pos = self._pos
+    self._time[pos] = now
+    self._status[pos] = self.statuses.index(vals.status) if vals.status in self.statuses else 0
+    self._done[pos] = done
+    self._used[pos] = -1 if vals.sizes[1] is None else vals.sizes[1]
+    self._pos = (pos + 1) % self.size
+    self._len = min(self._len + 1, self.size)
+    return self._account(vals.status, done, total, now)
+
+  def _account(self, status, done, total, now):  # Update current session
+    session = self._session
+    if session is None:
+      if status == 'busy':                        # Session is started
+        # Bytes done before the first poll are counted as for other transfers of session
+        self._session = [now, max(done, 0), max(done, 0), total]
+      return None
+    if total >= 0:                                # Transfer is in progress
+      if total == session[3] and done >= session[2]:  # The same transfer
+        session[1] += done - session[2]
+      else:                                       # Previous transfer is finished
+        session[1] += max(session[3] - session[2], 0) + done
+      session[2:] = [done, total]
+    if status == 'none':                          # Daemon is stopped: drop the session
+      self._session = None
+    elif status == 'idle':                        # Session is finished
+      self._session = None
+      transferred = session[1] + max(session[3] - session[2], 0)
+      duration = int(now - session[0])
+      finished = (session[0], duration, transferred, transferred // max(duration, 1))
+      self.sessions.append(finished)
+      self._log(finished)
+      return finished
+    return None
+
+  def _log(self, session):            # Append session to log file
+    logger.info('Sync session of %s: %d s, %s, %s/s' %
+                (self.name, session[1], formatSize(session[2]), formatSize(session[3])))
+    if self.logFile is None:
+      return
+    line = '%d\t%d\t%d\t%d\t%s\n' % (session + (self.name,))
+    try:
+      if os.path.getsize(self.logFile) + len(line) > self.logSize:
+        os.replace(self.logFile, self.logFile + '.1')   # Rotate log
+    except OSError:
+      pass                                        # No log yet
+    try:
+      with open(self.logFile, 'at') as f:
+        f.write(line)
+    except OSError:
+      logger.error('Session log write error: %s' % self.logFile)
+
+  def __len__(self):
+    return self._len
+
+  def __iter__(self):                 # Records from the oldest one
+    start = (self._pos - self._len) % self.size
+    for n in range(self._len):
+      pos = (start + n) % self.size
+      yield (self._time[pos], self.statuses[self._status[pos]], self._done[pos], self._used[pos])
+
+class Histogram(object):        # Distribution of measured values
+  ''' Histogram counts values in fixed buckets (upper bounds in ascending order), so accounting
+      of value doesn't allocate anything.
+      Histogram class methods:
+        observe    - Account the value.
+        cumulative - Returns numbers of values that are less or equal to bucket bounds (the
+                     last one is for +Inf bound) like Prometheus histogram does.
+        quantile   - Returns estimation of q-quantile (0 < q < 1) or None when there are no
+                     values. It is interpolated within the bucket (values above the last bound
+                     are estimated as the last bound).
+      Interface variables:
+        buckets - upper bounds of buckets
+        counts  - numbers of values in buckets (the last one is for values above the last bound)
+        count   - number of all values
+        sum     - sum of all values
+  '''
+  def __init__(self, buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5)):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.count = 0
+    self.sum = 0
+
+  def observe(self, value):           # Account value
+    self.counts[bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+
+  def cumulative(self):               # Cumulative bucket counts
+    return list(accumulate(self.counts))
+
+  def quantile(self, q):              # Estimate q-quantile
+    if not self.count:
+      return None
+    rank = q * self.count
+    seen = 0
+    for n, count in enumerate(self.counts):
+      if seen + count >= rank and count:
+        if n == len(self.buckets):
+          return self.buckets[-1]
+        low = self.buckets[n - 1] if n else 0
+        return low + (self.buckets[n] - low) * (rank - seen) / count
+      seen += count
+
+class Profiler(object):         # Timing probes of event pipeline stages
+  ''' Probes measure the wall time of methods calls and account it in histograms of stages.
+      Methods are wrapped by probes only when profiling is enabled, so disabled profiling
+      costs nothing.
+      Profiler class methods:
+        enable     - Enable profiling and instrument core stages (iNotify handling, status
+                     command and status parsing).
+        instrument - Wrap method (or static method) name of class owner with probe of stage
+                     (class.method by default). It does nothing when profiling is disabled,
+                     so it has to be called after enable and before the method usage
+                     (the method can't be wrapped after it was passed as callback).
+        observe    - Account time (sec) measured outside in stage.
+        summary    - Returns list of (stage, number of calls, p50 (ms), p99 (ms)).
+        report     - Returns text report made of summary.
+        dump       - Print report (it can be used as Timer handler).
+      Interface variables:
+        enabled    - profiling is enabled
+        stages     - histograms of stages: {stage: Histogram}
+  '''
+  enabled = False
+  stages = dict()
+  # Bucket bounds (sec): from 0.1 ms to 10 s
+  buckets = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+  @staticmethod
+  def enable():
+    Profiler.enabled = True
+    Profiler.instrument(FileWatcher, '_iNhandle')
+    Profiler.instrument(YDDaemon, 'getOutput')
+    Profiler.instrument(YDDaemon, '_parseOutput')
+
+  @staticmethod
+  def _stage(stage):                  # Histogram of stage
+    return Profiler.stages.setdefault(stage, Histogram(Profiler.buckets))
+
+  @staticmethod
+  def instrument(owner, name, stage=None):
+    if not Profiler.enabled:
+      return
+    method = owner.__dict__[name]
+    static = isinstance(method, staticmethod)
+    func = method.__func__ if static else method
+    observe = Profiler._stage(stage or owner.__name__ + '.' + name).observe
+    clock = time.perf_counter
+    def probe(*args, **kwargs):
+      start = clock()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        observe(clock() - start)
+    setattr(owner, name, staticmethod(probe) if static else probe)
+
+  @staticmethod
+  def observe(stage, value):
+    if Profiler.enabled:
+      Profiler._stage(stage).observe(value)
+
+  @staticmethod
+  def summary():
+    return [(stage, h.count, h.quantile(.5) * 1000, h.quantile(.99) * 1000)
+            for stage, h in Profiler.stages.items() if h.count]
+
+  @staticmethod
+  def report():
+    return '\n'.join(['%-32s %8s %10s %10s' % ('Stage', 'Calls', 'p50, ms', 'p99, ms')] +
+                     ['%-32s %8d %10.2f %10.2f' % s for s in Profiler.summary()])
+
+  @staticmethod
+  def dump():
+    print(Profiler.report(), flush=True)
+    return True
+
+class MetricsExporter(object):  # Prometheus textfile exporter of daemons metrics
+  ''' Exporter writes metrics of daemons (status, sizes, progress, status transitions, status
+      requests and their latency) and the application wakeups to the file in Prometheus text
+      format (to be collected by node_exporter textfile collector). The file is replaced
+      atomically and only when metrics differ from the written ones. Bursts of changes are
+      coalesced into one write per interval (ms). Nothing is written when path is None.
+      MetricsExporter class methods:
+        add     - Add daemon to export its metrics.
+        changed - Notify exporter that metrics of daemon could change.
+        setPath - Change the metrics file path (None - stop export).
+        render  - Returns metrics text.
+        write   - Write metrics file immediately (when metrics were changed).
+  '''
+  def __init__(self, path=None, interval=5000):
+    self.path = path                  # Metrics file path or None
+    self.daemons = []                 # Exported daemons
+    self._text = None                 # Last written metrics
+    self._writer = Coalescer(self.write, interval=interval, maxwait=interval, leading=False)
+
+  def add(self, daemon):              # Add daemon
+    self.daemons.append(daemon)
+    self.changed()
+
+  def changed(self):                  # Schedule write of changed metrics
+    if self.path is not None:
+      self._writer.call()
+
+  def setPath(self, path):            # Change metrics file path
+    self.path = path
+    self._text = None                 # New file has to be written anyway
+    self.changed()
+
+  @staticmethod
+  def _label(value):                  # Escape label value
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+  def render(self):                   # Make metrics text
+    families = []                     # [(name, type, help, [(name suffix, labels, value)])]
+    def family(name, mtype, text, samples):
+      families.append((name, mtype, text, [s if len(s) == 3 else ('',) + s for s in samples]))
+    daemons = [('daemon="%s"' % self._label(d.config.fileName), d) for d in self.daemons]
+    family('yd_daemon_status', 'gauge', 'Daemon status (1 - current status).',
+           [('%s,status="%s"' % (l, st), int(d.vals.status == st))
+            for l, d in daemons for st in StatusHistory.statuses[1:]])
+    family('yd_daemon_bytes', 'gauge', 'Yandex.Disk space in bytes.',
+           [('%s,kind="%s"' % (l, kind), size) for l, d in daemons
+            for kind, size in zip(('total', 'used', 'free', 'trash'), d.vals.sizes)
+            if size is not None])
+    family('yd_daemon_progress_ratio', 'gauge', 'Synchronization progress of current transfer.',
+           [(l, d.vals.percent / 100) for l, d in daemons if d.vals.percent is not None])
+    family('yd_daemon_transitions_total', 'counter', 'Number of daemon status changes.',
+           [(l, d.transitions) for l, d in daemons])
+    family('yd_daemon_status_requests_total', 'counter', 'Number of status command runs.',
+           [(l, d._fetcher.runs) for l, d in daemons])
+    samples = []
+    for l, d in daemons:
+      latency = d._fetcher.latency
+      samples += [('_bucket', '%s,le="%s"' % (l, bound), count)
+                  for bound, count in zip(latency.buckets + ('+Inf',), latency.cumulative())]
+      samples += [('_sum', l, latency.sum), ('_count', l, latency.count)]
+    family('yd_daemon_status_request_seconds', 'histogram', 'Status command latency.', samples)
+    family('yd_app_wakeups_total', 'counter', 'Number of application wakeups.',
+           [('source="inotify"', FileWatcher.wakeups), ('source="timer"', SlotTimer.wakeups)])
+    lines = []
+    for name, mtype, text, samples in families:
+      lines += ['# HELP %s %s' % (name, text), '# TYPE %s %s' % (name, mtype)]
+      lines += ['%s%s{%s} %s' % (name, suffix, labels, value) for suffix, labels, value in samples]
+    return '\n'.join(lines) + '\n'
+
+  def write(self):                    # Write metrics file when metrics changed
+    if self.path is None:
+      return
+    text = self.render()
+    if text == self._text:
+      return                          # Nothing changed
+    tmp = self.path + '.tmp'
+    try:
+      with open(tmp, 'wt') as f:
+        f.write(text)
+      os.replace(tmp, self.path)      # Collector never sees partially written file
+      self._text = text
+    except OSError:
+      logger.error('Metrics file write error: %s' % self.path)
+
+class FlightRecorder(logging.Handler):  # In-memory ring of recent log records
+  ''' Recorder keeps the last size log records of level and above without formatting them
+      (messages are formatted only when records are dumped), so the context of recorder level
+      is available without output of its messages. Records of messages below the level of
+      both the output and the recorder are not created at all (log calls are lazy), so the
+      recorder level defines the cost of logging in hot paths.
+      FlightRecorder class methods:
+        install - Attach recorder to the logger. Logger level is lowered to the recorder level
+                  while the other handlers of logger keep the current logger level.
+        dump    - Write formatted records to file (path by default) atomically. Returns the
+                  file path or None on write error.
+      Records are dumped automatically on error record (not more often than once per minute).
+  '''
+  def __init__(self, path, size=2000, level=logging.INFO):
+    logging.Handler.__init__(self, level)
+    self.path = path                  # Default dump file path
+    self.records = deque(maxlen=size) # Recent records
+    self._dumped = None               # Time of the last automatic dump
+    self.setFormatter(logging.Formatter('%(asctime)-15s %(levelname)-8s %(message)s'))
+
+  def install(self, logger):          # Attach recorder to logger
+    level = logger.getEffectiveLevel()
+    for handler in logger.handlers:
+      handler.setLevel(max(handler.level, level))
+    logger.setLevel(min(level, self.level))
+    logger.addHandler(self)
+
+  def emit(self, record):             # Store record (called by logging under handler lock)
+    self.records.append(record)
+    if record.levelno >= logging.ERROR:
+      now = time.monotonic()
+      if self._dumped is None or now - self._dumped >= 60:
+        self._dumped = now
+        self.dump()
+
+  def dump(self, path=None):          # Write records to file
+    path = path or self.path
+    with self.lock:
+      records = list(self.records)
+    lines = []
+    for record in records:
+      try:
+        lines.append(self.format(record))
+      except Exception:               # Bad message arguments
+        lines.append('%s (unformatted: %r)' % (record.msg, record.args))
+    tmp = path + '.tmp'
+    try:
+      with open(tmp, 'wt') as f:
+        f.write('\n'.join(lines) + '\n')
+      os.replace(tmp, path)
+    except OSError:
+      return None                     # It can't be logged: error record would dump again
+    return path
+
+#### Main daemon class
+class YDDaemon(object):         # Yandex.Disk daemon interface
+  '''
+  This is the fully automated class that serves as daemon interface.
+  Public methods:
+  __init__ - Handles initialization of the object and as a part - auto-start daemon if it
+             is required by configuration settings.
+  getOuput - Provides daemon output (in user language if optional parameter workLang is
+             False or missed). It is synchronous call, status events use non-blocking
+             requests via _StatusFetcher.
+  start    - Starts daemon if it is not started yet
+  stop     - Stops running daemon
+  exit     - Handles 'Stop on exit' facility according to daemon configuration settings.
+  change   - Call back function for handling daemon status changes outside the class.
+             It have to be redefined by UI update routine.
+             The parameters of the call - status values snapshot (see vals description below)
+             and the UpdateEvent object with with 5 boolean values:
+              stat is True when status has been changed,
+              prog is True when synchronization progress has been changed,
+              size is True when some of sizes has been changed,
+              last is True when list of last synchronized has been changed,
+              init is True when initial update event is raised.
+  configChange - Call back function for daemon config changes made outside (the config file
+             is watched and reloaded automatically). The parameter is the set of changed keys.
+             It can be redefined by UI.
+  setOptions - Changes iNotify events coalescing and status polling parameters.
+  Class interface variables:
+  config   - The daemon configuration dictionary (object of _DConfig(Config) class),
+             config.excludes is the index of excluded directories (see ExcludeIndex)
+  vals     - status values (object of StatusSnapshot class) with following attributes:
+              status - current daemon status
+              progress - synchronization progress or ''
+              laststatus - previous daemon status
+              total - total Yandex disk spase
+              used - currntly used spase
+              free - available space
+              trash - size of trash
+              lastitems - tuple of last synchronized items
+              sizes - total, used, free and trash in bytes
+             The snapshot is replaced (not changed) on each status change.
+  throughput - synchronization speed and remaining time estimation (see Throughput)
+  transitions - number of status changes
+  history  - status history and synchronization sessions (see StatusHistory)
+  ID       - the daemon identity string (empty in single daemon configuration)
+  '''
+
+  # cli.log lines of synchronization activity and words that can point to other statuses
+  _activityRe = re.compile(r'\b(upload|download|sync)\w*', re.I)
+  _statusWordsRe = re.compile(r'error|fail|paus|stop|idle|finish|complet|done|network|internet|' +
+                              r'auth|quota|space', re.I)
+
+  # Daemon output patterns: named value line and last synchronized item line
+  _valueRe = re.compile(r'^[ \t]*([^:\n]*[^:\s]):[ \t]*([^\r\n]*)', re.M)
+  _lastRe = re.compile(r"^[ \t]*[^:'\n]*: '(.*)'[ \t\r]*$", re.M)
+  # Daemon output names of status values
+  _outKeys = {'Synchronization core status': 'status', 'Sync progress': 'progress',
+              'Total': 'total', 'Used': 'used', 'Available': 'free', 'Trash size': 'trash'}
+
+  # Default daemon status values
+  _dvals = StatusSnapshot()
+
+  # Log file of synchronization sessions (None - sessions are not logged)
+  sessionLog = None
+  # Metrics exporter (see MetricsExporter) or None
+  exporter = None
+
+  class UpdateEvent(object):            # Changes control class (immutable)
+    '''
+    It wraps bit mask of changed fields (see StatusSnapshot.diff) and INIT bit.
+    '''
+    INIT = 1 << len(StatusSnapshot.fields)    # Bit of initialization event
+    __slots__ = ('mask',)
+
+    def __init__(self, mask=0):
+      object.__setattr__(self, 'mask', mask)
+
+    def __setattr__(self, name, value):
+      raise AttributeError('UpdateEvent is read only')
+
+    stat = property(lambda self: bool(self.mask & StatusSnapshot.STATUS))     # Status changed
+    prog = property(lambda self: bool(self.mask & StatusSnapshot.PROGRESS))   # Progress changed
+    size = property(lambda self: bool(self.mask & StatusSnapshot.SIZES))      # Some sizes changed
+    last = property(lambda self: bool(self.mask & StatusSnapshot.LASTITEMS))  # Last items changed
+    init = property(lambda self: bool(self.mask & YDDaemon.UpdateEvent.INIT)) # Initialization
+
+    def __bool__(self):   # Boolean representation of object
+      return bool(self.mask)
+
+    def __str__(self):    # String representation of object
+      str = (('stat, ' if self.stat else '') +
+             ('prog, ' if self.prog else '') +
+             ('size, ' if self.size else '') +
+             ('last, ' if self.last else '') +
+             ('init, ' if self.init else ''))
+      return '{' + str[: (-2 if str else None)]+'}'
+
+  _noUpdate = UpdateEvent()             # Event without changes
+
+  class _LogTail(object):               # Incremental reader of daemon cli.log
+    '''
+    Reads only the data that has been appended to the log file since previous reading.
+    read() returns list of new complete lines, or None when the new data can't be trusted:
+    file is not readable, it was truncated or replaced by new file (rotation). In last two
+    cases reading is restarted from the beginning of the new file.
+    '''
+    _bufSize = 1 << 20                  # Maximal amount of data to read at once
+
+    def __init__(self):
+      self._path = None
+
+    def start(self, path):               # Start reading from current end of file
+      self._path = path
+      self._rest = b''                          # Incomplete last line
+      try:
+        st = os.stat(path)
+        self._ino, self._offset = st.st_ino, st.st_size
+      except OSError:
+        self._ino, self._offset = None, 0
+
+    def read(self):                      # Read lines appended since previous call
+      try:
+        with open(self._path, 'rb') as f:
+          st = os.fstat(f.fileno())
+          reset = st.st_ino != self._ino or st.st_size < self._offset
+          if reset:                             # Rotated or truncated: start from the beginning
+            self._ino, self._offset, self._rest = st.st_ino, 0, b''
+          if st.st_size - self._offset > self._bufSize:
+            # Too much new data: only the latest lines are interesting
+            self._offset, self._rest = st.st_size - self._bufSize, b''
+            reset = True
+          f.seek(self._offset)
+          buf = f.read(self._bufSize)
+      except (OSError, TypeError):
+        return None
+      self._offset += len(buf)
+      lines = (self._rest + buf).split(b'\n')
+      self._rest = lines.pop()                  # Keep incomplete line till next reading
+      return None if reset else [l.decode('utf-8', 'replace') for l in lines]
+
+  class _Watcher(FileWatcher):          # Daemon iNotify watcher
+    '''
+    iNotify watcher object for monitor of changes daemon internal log for the fastest
+    reaction on status change. The log is watched via shared FileWatcher machinery (it keeps
+    watching after the log rotation). New log lines are available via tail.read().
+    '''
+    def __init__(self, handler, par=None):
+      super(YDDaemon._Watcher, self).__init__(handler, par)
+      self.tail = YDDaemon._LogTail()              # Reader of new log lines
+
+    def start(self, path):               # Activate iNotify watching of log in daemon dir
+      logPath = pathJoin(path.replace('~', userHome), '.sync', 'cli.log')
+      self.tail.start(logPath)
+      super(YDDaemon._Watcher, self).start(logPath)
+
+    def stop(self):                      # Stop iNotify watching
+      super(YDDaemon._Watcher, self).stop()
+      logger.info('iNotify wakeups: %d (%.1f per hour)' % (self.wakeups, self.wakeupsRate()))
+
+  class _StatusFetcher(object):         # Asynchronous 'yandex-disk status' runner
+    '''
+    Runs daemon status command without blocking of main loop (command output is read by main
+    loop fd watch) and passes the command output to handler. Only one command can be in flight
+    at a time: requests received while command is running are merged into one additional run.
+    Command that is not finished within timeout (ms) is killed and its output is treated as
+    empty one. Command exit is checked without waiting (the command can exit a bit later than
+    its output is closed). All fetchers share the bounded pool of maxRuns commands running simultaneously,
+    requests above this limit wait in queue.
+    '''
+    maxRuns = 4                         # Maximal number of simultaneously running commands
+    reapInterval = 20                   # Interval of checks that command has exited (ms)
+    _running = 0                        # Number of running commands
+    _queue = deque()                    # Fetchers waiting for run
+
+    def __init__(self, cmd, handler, timeout=5000):
+      self._cmd = cmd                           # Command to run (list of arguments)
+      self._handler = handler                   # Handler of command output
+      self._proc = None                         # Running process or None
+      self._pending = False                     # Request received while command was running
+      self._queued = False                      # Fetcher is waiting in queue
+      self.runs = 0                             # Number of command runs
+      self.latency = Histogram()                # Command latency (sec)
+      # Timer will kill hung command (not started initially)
+      self._timer = Timer(timeout, self._kill, start=False)
+
+    def request(self):                   # Request fresh command output
+      if self._proc is not None:
+        self._pending = True                    # Merge request with running one
+      elif not self._queued:                    # Queued request also merges new one
+        self._enqueue()
+
+    def _enqueue(self):                  # Put fetcher to queue and run queued fetchers
+      self._queued = True
+      YDDaemon._StatusFetcher._queue.append(self)
+      YDDaemon._StatusFetcher._admit()
+
+    @staticmethod
+    def _admit():                        # Run queued fetchers while pool is not full
+      cls = YDDaemon._StatusFetcher
+      while cls._running < cls.maxRuns and cls._queue:
+        fetcher = cls._queue.popleft()
+        fetcher._queued = False
+        fetcher._run()
+
+    def _run(self):                      # Start command
+      self._pending = False
+      try:
+        self._proc = subprocess.Popen(self._cmd, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL)
+      except OSError:
+        logger.error('Can\'t run: %s' % ' '.join(self._cmd))
+        self._handler('')                       # Daemon is not installed or bad
+        return
+      YDDaemon._StatusFetcher._running += 1
+      self.runs += 1
+      self._started = time.monotonic()
+      self._out = []                            # Output chunks
+      self._timer.start()
+      self._watch = loop.io_add_watch(self._proc.stdout.fileno(), loop.PRIORITY_DEFAULT,
+                                      loop.IO_IN | loop.IO_HUP, self._read)
+
+    def _read(self, fd, condition):      # Read command output (called by loop on fd input)
+      data = os.read(fd, 65536)
+      if data:
+        self._out.append(data)
+        return True
+      self._done()                              # End of output
+      return False
+
+    def _kill(self):                     # Kill hung command (triggered by self._timer)
+      self._timer.stop()
+      logger.warning('Daemon status request timeout: %s' % ' '.join(self._cmd))
+      self._proc.kill()                         # Communication will be finished by _read/_reap
+      return False
+
+    def _done(self):                     # Handle end of command output
+      loop.source_remove(self._watch)           # Output fd can be reused by the next command
+      self._proc.stdout.close()
+      if self._reap():                          # Output is closed but command is still running
+        loop.timeout_add(self.reapInterval, self._reap)
+
+    def _reap(self):                     # Handle command completion (True - not exited yet)
+      cls = YDDaemon._StatusFetcher
+      retCode = self._proc.poll()               # Main loop is never blocked by waiting
+      if retCode is None:
+        return True                             # Check it later (hung command is killed by timer)
+      self._timer.stop()
+      # Empty output when daemon is not running or bad
+      output = b''.join(self._out).decode('utf-8', 'replace') if retCode == 0 else ''
+      self._proc = None
+      cls._running -= 1
+      self.latency.observe(time.monotonic() - self._started)
+      Profiler.observe('Status command', time.monotonic() - self._started)
+      self._handler(output)
+      if self._pending:                         # Run merged request
+        self._pending = False
+        self._enqueue()
+      else:
+        cls._admit()
+      return False
+
+  class _DConfig(Config):               # Redefined class for daemon config
+
+    rawKeys = ('exclude-dirs',)         # Folder names like 'n' or 'yes' are not booleans
+
+    def __init__(self, *args, **kwargs):
+      self.excludes = ExcludeIndex()      # Index of 'exclude-dirs' (updated by load)
+      super(YDDaemon._DConfig, self).__init__(*args, **kwargs)
+
+    def save(self):  # Update daemon config file
+      # Make a copy of values
+      values = dict(self)
+      # Convert values representation
+      ro = values.get('read-only', False)
+      values['read-only'] = '' if ro else None
+      values['overwrite'] = '' if values.get('overwrite', False) and ro else None
+      exList = values.get('exclude-dirs', None)
+      if exList:
+        values['exclude-dirs'] = ','.join(CVal(exList))
+      super(YDDaemon._DConfig, self).save(values=values)
+
+    def load(self):  # Get daemon config from its config file
+      if super(YDDaemon._DConfig, self).load():             # Load config from file
+        # Convert values representations
+        self['read-only'] = (self.get('read-only', False) == '')
+        self['overwrite'] = (self.get('overwrite', False) == '')
+        self.setdefault('startonstartofindicator', True)    # New value to start daemon individually
+        self.setdefault('stoponexitfromindicator', False)   # New value to stop daemon individually
+        exDirs = self.setdefault('exclude-dirs', None)
+        if isinstance(exDirs, str):
+          # Additional parsing required when quoted value like "dir,dir,dir" is specified.
+          # When the value specified without quotes it will be already list like [dir, dir, dir].
+          self['exclude-dirs'] = self.getValue(exDirs, False)
+        self.excludes = ExcludeIndex(self['exclude-dirs'], self.get('dir', ''))
+        return True
+      else:
+        return False
+
+  def __init__(self, cfgFile, ID, events=None, polling=None, output=None):  # Check daemon
+    '''
+    Check that daemon installed and configured.
+    cfgFile  - full path to config file
+    ID       - identity string '#<n> ' in multi-instance environment or
+               '' in single instance environment
+    events   - dictionary with Coalescer parameters for iNotify events or None (defaults)
+    polling  - dictionary with PollScheduler parameters or None (defaults)
+    output   - daemon status output received in advance (see probe) or None'''
+    self.ID = ID                                      # Remember daemon identity
+    if not pathExists('/usr/bin/yandex-disk'):
+      self._errorDialog('NOTINSTALLED')
+      self.abort('Daemon is not installed')
+    # Try to read Yandex.Disk configuration file and make sure that it is correctly configured
+    self.config = self._DConfig(cfgFile, load=False)
+    while not (self.config.load() and
+               pathExists(self.config.get('dir', '')) and
+               pathExists(self.config.get('auth', ''))):
+      if self._errorDialog('NOCONFIG') != 0:
+        if ID:
+          self.config['dir'] = ''
+          # Exit from loop in multi-instance configuration
+          break
+        else:
+          self.abort('Daemon is not configured')
+    # Config file changes made outside are applied when the file writing is finished
+    self._cfgEvents = Coalescer(self._configHandler, interval=500, leading=False)
+    self._cfgWatcher = FileWatcher(self._cfgEvents.call)
+    self._cfgWatcher.start(self.config.fileName)
+    # Initialize watching staff
+    self.scheduler = PollScheduler(**(polling or {}))
+    self._wTimer = SlotTimer(self.scheduler.base, self._eventHandler, par=False, start=True)
+    # Bursts of iNotify events are passed to event handler as a few calls
+    self._events = Coalescer(self._eventHandler, True, **(events or {}))
+    self._iNtfyWatcher = self._Watcher(self._events.call)
+    self._fetcher = self._StatusFetcher(self._statusCmd(self.config.fileName),
+                                          self._statusHandler)
+    self.update = YDDaemon._noUpdate                  # Initialize changes control object
+    self.vals = YDDaemon._dvals                       # Load default daemon status values
+    self.throughput = Throughput()                    # Synchronization speed estimator
+    self.history = StatusHistory(cfgFile, logFile=YDDaemon.sessionLog)  # Status history
+    self._lastOut = None                              # Previous parsed daemon output
+    self.transitions = 0                              # Number of status changes
+    if YDDaemon.exporter is not None:
+      YDDaemon.exporter.add(self)
+    # Check that daemon is running
+    out = self.getOutput() if output is None else output
+    if out:                                           # Is daemon running?
+      self._parseOutput(out)                          # Update status values
+      # Set unknown last status as current status
+      self._override(laststatus=self.vals.status)
+      self._initEvent()                               # Manually raise initial change event
+      self._iNtfyWatcher.start(self.config['dir'])    # Activate iNotify watcher
+    else:                                             # Daemon is not running
+      started = False
+      if self.config.get('startonstartofindicator', True):
+        started = not self.start()                    # Start daemon if it is required
+      if not started:
+        # Set current status and unknown last status as 'none'
+        self._override(status='none', laststatus='none')
+        self._initEvent()                             # Manually raise initial change event
+
+  def _override(self, **values):        # Replace status values not taken from daemon output
+    self.vals = self.vals.replace(**values)
+    self._lastOut = None                  # The next output has to be parsed even if it is the same
+
+  def _eventHandler(self, iNtf):        # Daemon event handler
+    '''
+    Handle iNotify and and Timer based events.
+    It requests fresh daemon output asynchronously (see _statusHandler for its processing).
+    It can be called by timer (when byNotifier=False) or by iNonifier
+    (when byNotifier=True)'''
+
+    if not iNtf or self._logChanged():
+      self._fetcher.request()                 # Request fresh daemon output
+    logger.debug('Raw event %s%s', self.ID, 'iNtfy' if iNtf else 'Timer')
+    # --- Handle timer delays ---
+    if iNtf:                                  # True means that it is called by iNonifier
+      self._wTimer.update(self.scheduler.reset())
+    else:                                     # It called by timer
+      self._wTimer.update(self.scheduler.next(self.vals.status))
+    return True                               # True is required to continue activations by timer.
+
+  def _logChanged(self):                # Check that new log lines can change daemon status
+    '''
+    It reads lines appended to daemon log and returns False only when they surely don't change
+    the current status: no new complete lines, or only sync activity lines (without any word
+    that can point to other status) in 'busy' status. The log format is not documented, so
+    the status is never guessed from the log: misclassified activity line only delays the
+    status change till the next timer poll (the interval is short in 'busy' status). Any
+    other log content requires the fresh daemon output.'''
+    lines = self._iNtfyWatcher.tail.read()
+    if lines is None:                         # Log was rotated, truncated or can't be read
+      return True
+    if not lines:                             # Only incomplete line was appended
+      return False
+    return not (self.vals.status == 'busy' and
+                all(self._activityRe.search(l) and not self._statusWordsRe.search(l)
+                    for l in lines))
+
+  def _statusHandler(self, out):        # Daemon output handler (called by self._fetcher)
+    '''
+    After parsing the daemon output it raises outside change event if daemon changes
+    at least one of its status values.'''
+
+    # Parse fresh daemon output. Parsing returns true when something changed
+    if self._parseOutput(out):
+      if self.update.prog or self.update.stat:
+        self.throughput.update(self.vals)     # Account new progress
+      self.history.add(self.vals)             # Record status history
+      if self.update.stat:
+        self.transitions += 1
+      self.change(self.vals, self.update)     # Raise outside update event
+    if YDDaemon.exporter is not None:
+      YDDaemon.exporter.changed()             # Status request metrics are changed anyway
+    logger.debug('Status %s%s -> %s', self.ID, self.vals.laststatus, self.vals.status)
+
+  def _initEvent(self):                 # Raise initial change event
+    self.update = YDDaemon.UpdateEvent(self.update.mask | YDDaemon.UpdateEvent.INIT)
+    self.history.add(self.vals)
+    self.change(self.vals, self.update)
+
+  def change(self, vals, update):       # Redefined update handler
+    logger.debug('Update event: %s \nValues : %s', update, vals)
+
+  def _configHandler(self):             # Reload daemon config (called when config file changed)
+    new = self._DConfig(self.config.fileName, load=False)
+    if not new.load():
+      return                                # Config is being replaced: wait for the next event
+    diff = {k for k in set(self.config) | set(new) if self.config.get(k) != new.get(k)}
+    if not diff:
+      return                                # Nothing changed (e.g. config saved by ourselves)
+    logger.info('%sDaemon config changed: %s' % (self.ID, ', '.join(sorted(diff))))
+    self.config.clear()
+    self.config.update(new)
+    self.config.excludes = new.excludes
+    if 'dir' in diff and self._iNtfyWatcher.path is not None:
+      self._iNtfyWatcher.start(self.config.get('dir', ''))  # Move log watch to the new dir
+      self._fetcher.request()
+    self.configChange(diff)
+
+  def configChange(self, keys):         # Redefined config change handler
+    logger.debug('Config change event: %s' % ', '.join(sorted(keys)))
+
+  def setOptions(self, events=None, polling=None):  # Change events and polling parameters
+    self._events.setup(**(events or {}))
+    self.scheduler.setup(**(polling or {}))
+
+  @staticmethod
+  def _statusCmd(cfgFile, userLang=False):  # Make 'yandex-disk status' command
+    cmd = ['yandex-disk','-c', cfgFile, 'status']
+    if not userLang:      # Change locale settings when it required
+      cmd = ['env', '-i', "LANG='en_US.UTF8'"] + cmd
+    return cmd
+
+  def getOutput(self, userLang=False):  # Get result of 'yandex-disk status' (synchronously)
+    return self._output(self._statusCmd(self.config.fileName, userLang))
+
+  @staticmethod
+  def _output(cmd):                     # Run status command with timeout
+    try:
+      output = subprocess.check_output(cmd, universal_newlines=True, timeout=5)
+    except:
+      output = ''         # daemon is not running or bad
+    #logger.debug('output = %s' % output)
+
+    return output
+
+  @staticmethod
+  def probe(cfgFiles, workers=8):       # Get status outputs of several daemons concurrently
+    '''
+    Returns dictionary {cfgFile: output} with status outputs of daemons with specified config
+    files. Status commands are run by pool of worker threads (not more than workers at once).'''
+    cfgFiles = list(cfgFiles)
+    cmds = [YDDaemon._statusCmd(c) for c in cfgFiles]
+    with ThreadPoolExecutor(max_workers=max(min(workers, len(cmds)), 1)) as pool:
+      return dict(zip(cfgFiles, pool.map(YDDaemon._output, cmds)))
+
+  def _parseOutput(self, out):          # Parse the daemon output
+    '''
+    It parses the daemon output and check that something changed from last daemon status.
+    The self.vals snapshot is replaced with new daemon statuses and self.update represents
+    the changes in self.vals. It returns True is something changed
+
+    Output that is equal to the previous one is not parsed: nothing can be changed in this case
+    (the most frequent case in 'idle' status). Otherwise the output is parsed in one pass with
+    precompiled patterns.
+
+    Daemon status is converted form daemon raw statuses into internal representation.
+    Internal status can be on of the following: 'busy', 'idle', 'paused', 'none', 'no_net', 'error'.
+    Conversion is done by following rules:
+     - empty status (daemon is not running) converted to 'none'
+     - statuses 'busy', 'idle', 'paused' are passed 'as is'
+     - 'index' is ignored (previous status is kept)
+     - 'no internet access' converted to 'no_net'
+     - 'error' covers all other errors, except 'no internet access'
+    '''
+    if out == self._lastOut:                # Same output: values are the same too
+      if self.vals.laststatus != self.vals.status:
+        self.vals = self.vals.replace(laststatus=self.vals.status)
+      self.update = YDDaemon._noUpdate
+      return False
+    self._lastOut = out
+    # Split output on two parts: list of named values and file list
+    output, _, files = out.partition('Last synchronized items:')
+    # Collect named status values (use only lines like 'name: value')
+    res = {self._outKeys[n]: v for n, v in self._valueRe.findall(output) if n in self._outKeys}
+    # Convert daemon raw status to internal representation
+    laststatus = self.vals.status             # Store previous status
+    val = res.get('status', '')
+    res['status'] = (# Convert '' into 'none' status
+                     'none' if not val else
+                     # Ignore index status
+                     laststatus if val == 'index' else
+                     # Rename long error status
+                     'no_net' if val == 'no internet access' else
+                     # pass 'busy', 'idle' and 'paused' statuses 'as is'
+                     val if val in ['busy', 'idle', 'paused'] else
+                     # Status 'error' covers 'error', 'failed to connect to daemon process' etc.
+                     'error')
+    for key in ('total', 'used', 'free', 'trash'):
+      res[key] = res.get(key) or '...'        # Make default filling for empty values
+    # Parse last synchronized items: path is everything between the first and the last quote
+    res['lastitems'] = self._lastRe.findall(files)
+    vals = StatusSnapshot(laststatus=laststatus, **res)
+    self.update = YDDaemon.UpdateEvent(vals.diff(self.vals))   # Remember what is changed
+    self.vals = vals
+    return bool(self.update)
+
+  def _errorDialog(self, err):          # Handle error (redefined by UI to show error dialogue)
+    logger.error('Daemon initialization failed: %s', err)
+    return 0 if err == 'NONET' else 1   # 0 when error is not critical
+
+  def start(self):                      # Execute 'yandex-disk start'
+    '''
+    Execute 'yandex-disk start' and return '' if success or error message if not
+    ... but sometime it starts successfully with error message
+    Additionally it starts iNotify monitoring in case of success start
+    '''
+    err = ''
+    while True:
+      try:                                          # Try to start
+        msg = subprocess.check_output(['yandex-disk', '-c', self.config.fileName, 'start'],
+                                      universal_newlines=True)
+        logger.info('Start success, message: %s' % msg)
+        err =  ''
+      except subprocess.CalledProcessError as e:
+        logger.error('Daemon start failed:%s' % e.output)
+        if e.output == '':                          # Probably 'os: no file'
+          return 'NOTINSTALLED'
+        err = ('NONET' if 'Proxy' in e.output else
+               'BADDAEMON' if 'daemon' in e.output else
+               'NOCONFIG' if "'dir'" in e.output or 'OAuth' in e.output else
+               err)
+      # Handle the starting error
+      if err != '' and self._errorDialog(err) == 0:
+        self.config.load()                          # Reload created configuration file & try again
+      else:
+        break
+    if err == '':
+      self.vals = YDDaemon._dvals                   # Initialise default values
+      self._lastOut = None                          # Values are reset: parse output anyway
+      self._parseOutput(self.getOutput())           # Parse fresh daemon output
+      # Set current status to avoid index status and well known previous status
+      self._override(status='paused', laststatus='none')
+      self._initEvent()                             # Manually raise initial change event
+      self._iNtfyWatcher.start(self.config['dir'])  # Activate watcher with self.handler
+    return err
+
+  def stop(self):                       # Execute 'yandex-disk stop'
+    try:
+      msg = subprocess.check_output(['yandex-disk', '-c', self.config.fileName, 'stop'],
+                                    universal_newlines=True)
+    except:
+      msg = ''
+    if msg:
+      self._iNtfyWatcher.stop()
+      self._fetcher.request()           # Request fresh status to raise change event
+      self._wTimer.update(self.scheduler.reset())
+      return True
+    else:
+      return False
+
+  def abort(self, msg):                 # Exit from application (redefined by UI)
+    sys.exit(msg)
+
+  def exit(self):                       # Handle daemon/indicator closing
+    # Stop yandex-disk daemon if it is required by its configuration
+    if self.vals.status != 'none' and self.config.get('stoponexitfromindicator', False):
+      self.stop()
+      logger.info('Demon %sstopped'%self.ID)
+    logger.info('Daemon %siNotify wakeups (all daemons): %d (%.1f per hour)' %
+                (self.ID, self._Watcher.wakeups, self._Watcher.wakeupsRate()))
+    logger.info('Daemon %siNotify events: %d, handled as: %d' %
+                (self.ID, self._events.events, self._events.calls))
+    logger.info('Daemon %spolling: %s, status requests: %d' %
+                (self.ID, str(self.scheduler.stats()), self._fetcher.runs))
+    if YDDaemon.exporter is not None:
+      YDDaemon.exporter.write()                     # Write final metrics
+
+class Monitor(YDDaemon):        # Headless daemon monitor
+
+  def change(self, vals, update):       # Log daemon status changes
+    if not logger.isEnabledFor(logging.INFO):
+      return                            # Neither output nor recorder takes the message
+    speed = ('' if not self.throughput.rate else ' %s/s' % formatSize(self.throughput.rate) +
+             ('' if self.throughput.eta is None else ', ETA %d s' % self.throughput.eta))
+    logger.info('%sChange event: %s, status: %s %s%s, used: %s/%s, free: %s, trash: %s',
+                self.ID, update, vals.status, vals.progress, speed, vals.used,
+                vals.total, vals.free, vals.trash)
+
+def intOption(config, key, default):  # Positive integer value of application config or default
+  value = config.get(key, default)
+  try:
+    if not isinstance(value, bool) and int(value) > 0:  # 'yes'/'no' are decoded as bool
+      return int(value)
+  except (TypeError, ValueError):
+    pass
+  logger.warning('Wrong value of \'%s\': \'%s\', %d is used.' % (key, value, default))
+  return default
+
+def daemonOptions(config):      # YDDaemon events and polling parameters from application config
+  return ({'interval': intOption(config, 'eventinterval', 500),
+           'maxwait': intOption(config, 'eventmaxwait', 2000),
+           'leading': config.get('eventleading', True),
+           'trailing': config.get('eventtrailing', True)},
+          {'policy': config.get('pollpolicy', 'linear'),
+           'maxInt': intOption(config, 'pollmax', 10000),
+           'idleInt': intOption(config, 'pollidlemax', 60000)})
+
+def metricsFile(config):       # Metrics file path from application config or None
+  path = config.get('metricsfile', '')
+  return os.path.expanduser(path) if path else None
+
+def main(args=None):            # Headless monitor of daemons
+  parser = argparse.ArgumentParser(description='Headless monitor of yandex-disk daemons')
+  parser.add_argument('-l', '--log', type=int, choices=range(10, 60, 10), dest='level',
+                      default=20, help='Sets the logging level. Default: 20')
+  parser.add_argument('-c', '--config', dest='cfg', metavar='path', action='append', default=[],
+                      help='Path to configuration file of YandexDisk daemon. Default: daemons ' +
+                           'from the indicator configuration')
+  parser.add_argument('--profile', type=int, nargs='?', const=60, metavar='sec',
+                      help='Print timing summary of event pipeline stages every sec seconds. ' +
+                           'Default: 60')
+  parser.add_argument('--record-level', type=int, choices=range(10, 60, 10), dest='record',
+                      default=20, help='Sets the level of messages kept by in-memory flight ' +
+                                       'recorder (see FlightRecorder). Default: 20')
+  args = parser.parse_args(args)
+  logging.basicConfig(format='%(asctime)-15s %(levelname)-8s %(message)s')
+  logger.setLevel(args.level)
+  # Recent records (of record level and above) are dumped on error or by SIGUSR1
+  recorder = FlightRecorder(pathJoin(userHome, '.config', 'yd-tools', 'flight.log'),
+                            level=args.record)
+  recorder.install(logger)
+  signal.signal(signal.SIGUSR1, lambda signum, frame: recorder.dump())
+  if args.profile:
+    Profiler.enable()           # Probes have to be installed before the stages are used
+    Profiler.instrument(Monitor, 'change')
+    Timer(args.profile * 1000, Profiler.dump)
+  config = Config(pathJoin(userHome, '.config', 'yd-tools', 'yandex-disk-indicator.conf'))
+  YDDaemon.sessionLog = pathJoin(userHome, '.config', 'yd-tools', 'sessions.log')
+  YDDaemon.exporter = MetricsExporter(metricsFile(config))
+  paths = [d.replace('~', userHome) for d in
+           (args.cfg or CVal(config.get('daemons', '~/.config/yandex-disk/config.cfg')))]
+  outputs = YDDaemon.probe(paths)
+  events, polling = daemonOptions(config)
+  daemons = [Monitor(d, '#%d ' % n if len(paths) > 1 else '', events, polling, outputs[d])
+             for n, d in enumerate(paths)]
+  def optionsChange():          # Apply events, polling and metrics options changed in config file
+    new = Config(config.fileName, load=False)
+    if not new.load():
+      return                    # Config is being replaced: wait for the next event
+    keys = {k for k in set(config) | set(new) if new.get(k) != config.get(k)}
+    if not keys:
+      return                    # Nothing changed
+    logger.info('Config changed: %s' % ', '.join(sorted(keys)))
+    config.clear()              # Removed values return to their defaults (see daemonOptions)
+    config.update(new)
+    for d in daemons:
+      d.setOptions(*daemonOptions(config))
+    if 'metricsfile' in keys:
+      YDDaemon.exporter.setPath(metricsFile(config))
+  FileWatcher(Coalescer(optionsChange, interval=500, leading=False).call).start(config.fileName)
+  for sig in (signal.SIGINT, signal.SIGTERM):
+    signal.signal(sig, lambda signum, frame: loop.quit())
+  loop.run()
+  for d in daemons:
+    d.exit()
+  if args.profile:
+    Profiler.dump()
+
+if __name__ == '__main__':
+  sys.exit(main())